@@ -1,7 +1,31 @@
 """Assembly code writer for generating formatted x86-64 assembly output."""
 
+import io
+from collections.abc import Iterable
+from functools import lru_cache
 from textwrap import dedent
 
+# Indentation prefixes for the common indent levels, built once instead of per line
+_INDENTS = tuple("\t" * level for level in range(8))
+
+
+def _indent(indent_level: int) -> str:
+    return _INDENTS[indent_level] if indent_level < len(_INDENTS) else "\t" * indent_level
+
+
+@lru_cache(maxsize=1024)
+def _render_block(code: str, indent_level: int) -> str:
+    """Dedent, strip and indent a multi-line block into newline-terminated text.
+
+    Memoized because most blocks are the compiler's constant ASM_* templates, so
+    the dedent work is done once per template rather than once per emit.
+    """
+    prefix = _indent(indent_level)
+    return "".join(
+        prefix + line + "\n" if line.strip() else "\n"  # Empty lines stay empty
+        for line in dedent(code).strip().split("\n")
+    )
+
 
 class SectionWriter:
     """Writer for generating formatted assembly code within a section.
@@ -11,11 +35,11 @@ class SectionWriter:
 
     Attributes:
         section_name: Optional name of the assembly section (e.g., "data", "text").
-        code: List of assembly code lines being generated.
+        buffer: Text buffer holding the emitted assembly, one newline-terminated line at a time.
     """
 
     section_name: str | None
-    code: list[str]
+    buffer: io.StringIO
 
     def __init__(self, section_name: str | None = None):
         """Initialize the writer with an optional section name and empty code buffer.
@@ -25,7 +49,13 @@ class SectionWriter:
                          If None, no section header will be emitted.
         """
         self.section_name = section_name
-        self.code = []
+        self.buffer = io.StringIO()
+        # Last get_output() result and the buffer position it was built at; the buffer
+        # is append-only, so an unchanged position means the cached text is current
+        self._output: str | None = None
+        self._output_position = 0
+        # Set by blank_line(); written as a single empty line before the next emitted line
+        self._pending_blank = False
 
     def emit(self, code: str, indent_level: int = 1) -> None:
         """Emit assembly code with automatic indentation.
@@ -34,11 +64,45 @@ class SectionWriter:
             code: The assembly code to emit (may be multiline).
             indent_level: Number of tab characters to prepend to each line.
         """
-        for line in dedent(code).strip().split("\n"):
-            if line.strip():  # Non-empty lines get indented
-                self.code.append("\t" * indent_level + line)
-            else:  # Empty lines stay empty
-                self.code.append("")
+        if "\n" in code:
+            self._flush_blank()
+            self.buffer.write(_render_block(code, indent_level))
+        else:
+            # A single line has no common indentation to remove
+            self.emit_line(code.strip(), indent_level)
+
+    def emit_line(self, line: str, indent_level: int = 1) -> None:
+        """Emit a single, already-normalized line of assembly.
+
+        Unlike emit(), no dedenting, splitting or stripping is performed, making this
+        the cheapest way to emit one instruction at a time.
+
+        Args:
+            line: A single line of assembly without surrounding whitespace.
+            indent_level: Number of tab characters to prepend to the line.
+        """
+        self._flush_blank()
+        write = self.buffer.write
+        if line:  # Empty lines stay empty
+            write(_indent(indent_level))
+            write(line)
+        write("\n")
+
+    def emit_lines(self, lines: Iterable[str], indent_level: int = 1) -> None:
+        """Emit a sequence of already-normalized lines of assembly.
+
+        Args:
+            lines: Lines without surrounding whitespace; empty strings become blank lines.
+            indent_level: Number of tab characters to prepend to each non-empty line.
+        """
+        self._flush_blank()
+        prefix = _indent(indent_level)
+        write = self.buffer.write
+        for line in lines:
+            if line:  # Empty lines stay empty
+                write(prefix)
+                write(line)
+            write("\n")
 
     def emit_raw(self, code: str) -> None:
         """Emit assembly code without any indentation.
@@ -48,7 +112,23 @@ class SectionWriter:
         Args:
             code: The assembly code to emit (labels, directives, etc.).
         """
-        self.code.append(dedent(code).strip())
+        self._flush_blank()
+        # Single-line input (labels) has no common indentation worth dedenting
+        self.buffer.write(code.strip() if "\n" not in code else dedent(code).strip())
+        self.buffer.write("\n")
+
+    def blank_line(self) -> None:
+        """Request a blank separator line before the next emitted line.
+
+        Consecutive requests collapse into one blank line, and a request that is not
+        followed by any more code is dropped.
+        """
+        self._pending_blank = True
+
+    def _flush_blank(self) -> None:
+        if self._pending_blank:
+            self._pending_blank = False
+            self.buffer.write("\n")
 
     def get_output(self) -> str:
         """Get the complete generated assembly code with optional section header.
@@ -58,10 +138,17 @@ class SectionWriter:
             followed by all emitted assembly code joined by newlines.
             Returns empty string if no code has been emitted.
         """
-        if not self.code:
+        position = self.buffer.tell()
+        if not position:
             return ""
+        if self._output is not None and position == self._output_position:
+            return self._output
 
+        # Every line is newline-terminated in the buffer; drop the final terminator
+        code = self.buffer.getvalue()[:-1]
         if self.section_name:
             section_header = f"section .{self.section_name}"
-            return section_header + "\n" + "\n".join(self.code)
-        return "\n".join(self.code)
+            code = section_header + "\n" + code
+
+        self._output, self._output_position = code, position
+        return code
@@ -1,39 +1,63 @@
 """AST Node definitions for the toy language."""
 
 from dataclasses import dataclass, field
-from enum import Enum
+from enum import IntEnum
 
 
-class BinOpType(Enum):
-    """Binary operator types."""
+class BinOpType(IntEnum):
+    """Binary operator types.
+
+    Members are consecutive small integers so code generators can index
+    per-operator tables directly. The source spelling is available as `symbol`.
+    Members are singletons, so operators are compared with `is` (as with
+    UnaryOpType), which avoids the enum's `__eq__`.
+    """
 
     # Arithmetic operators
-    ADD = "+"
-    SUB = "-"
-    MUL = "*"
-    DIV = "/"
+    ADD = 0
+    SUB = 1
+    MUL = 2
+    DIV = 3
 
     # Comparison operators
-    EQ = "=="
-    NE = "!="
-    LT = "<"
-    LE = "<="
-    GT = ">"
-    GE = ">="
+    EQ = 4
+    NE = 5
+    LT = 6
+    LE = 7
+    GT = 8
+    GE = 9
 
     # Logical operators (short-circuit evaluation)
-    AND = "&&"
-    OR = "||"
+    AND = 10
+    OR = 11
+
+    @property
+    def symbol(self) -> str:
+        """Source-level spelling of the operator (e.g. "+")."""
+        return _BINOP_SYMBOLS[self]
+
 
+# Indexed by BinOpType value
+_BINOP_SYMBOLS = ("+", "-", "*", "/", "==", "!=", "<", "<=", ">", ">=", "&&", "||")
 
-class UnaryOpType(Enum):
+
+class UnaryOpType(IntEnum):
     """Unary operator types."""
 
-    NEGATE = "-"  # Arithmetic negation
-    NOT = "!"  # Logical NOT
+    NEGATE = 0  # Arithmetic negation
+    NOT = 1  # Logical NOT
+
+    @property
+    def symbol(self) -> str:
+        """Source-level spelling of the operator (e.g. "-")."""
+        return _UNARYOP_SYMBOLS[self]
+
 
+# Indexed by UnaryOpType value
+_UNARYOP_SYMBOLS = ("-", "!")
 
-@dataclass
+
+@dataclass(slots=True)
 class SourceLocation:
     """Source code location information for an AST node.
 
@@ -60,12 +84,16 @@ class SourceLocation:
         return "unknown location"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class ASTNode:
     """Base class for all AST nodes.
 
     All AST nodes track their source location for better error messages
     and debugging. Location is optional and populated during parsing.
+
+    Nodes compare and hash by identity (eq=False), so they can be used directly
+    as dictionary keys by compiler passes. They are not frozen because the parser
+    attaches the location after construction.
     """
 
     location: SourceLocation | None = field(default=None, kw_only=True)
@@ -80,12 +108,12 @@ class ASTNode:
 
 
 # Statements
-@dataclass
+@dataclass(slots=True, eq=False)
 class Statement(ASTNode):
     """Base class for all statement nodes."""
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Assignment(Statement):
     """Variable assignment statement.
 
@@ -96,7 +124,7 @@ class Assignment(Statement):
     value: "Expr"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Print(Statement):
     """Print statement without newline.
 
@@ -106,7 +134,7 @@ class Print(Statement):
     value: "Expr"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Println(Statement):
     """Print statement with newline.
 
@@ -116,7 +144,7 @@ class Println(Statement):
     value: "Expr"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class IfStmt(Statement):
     """Conditional if/else statement.
 
@@ -129,7 +157,7 @@ class IfStmt(Statement):
     else_body: list[Statement] | None = None
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class WhileLoop(Statement):
     """While loop statement.
 
@@ -141,7 +169,7 @@ class WhileLoop(Statement):
     body: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class ForLoop(Statement):
     """For loop statement.
 
@@ -164,7 +192,7 @@ class ForLoop(Statement):
     body: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class ReturnStmt(Statement):
     """Return statement.
 
@@ -174,24 +202,24 @@ class ReturnStmt(Statement):
     expr: "Expr"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Break(Statement):
     """Break statement - exits the innermost loop."""
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Continue(Statement):
     """Continue statement - skips to next iteration of innermost loop."""
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class CallStmt(Statement):
     """Statement wrapper for a function call expression."""
 
     call: "Call"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class SubroutineDef(ASTNode):
     """Function/subroutine definition.
 
@@ -203,7 +231,7 @@ class SubroutineDef(ASTNode):
     body: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Program(ASTNode):
     """Root node of the AST representing the entire program.
 
@@ -215,33 +243,47 @@ class Program(ASTNode):
 
 
 # Expressions
-@dataclass
+@dataclass(slots=True, eq=False)
 class Expr(ASTNode):
     """Base class for expressions."""
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Number(Expr):
     """Integer literal expression."""
 
     value: int
 
+    @classmethod
+    def of(cls, value: int) -> "Number":
+        """Return a shared literal node for small values, or a fresh one otherwise.
+
+        Intended for nodes synthesized by compiler passes (which carry no source
+        location). Shared instances must not be mutated.
+        """
+        cached = _SMALL_NUMBERS.get(value)
+        return cached if cached is not None else cls(value)
+
+
+# Flyweight literals for the most common small integers, see Number.of()
+_SMALL_NUMBERS = {value: Number(value) for value in range(-1, 257)}
+
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class String(Expr):
     """String literal expression."""
 
     value: str
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Var(Expr):
     """Variable reference expression."""
 
     name: str
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class BinOp(Expr):
     """Binary operation expression.
 
@@ -262,7 +304,7 @@ class BinOp(Expr):
     right: Expr
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class UnaryOp(Expr):
     """Unary operation expression.
 
@@ -277,7 +319,7 @@ class UnaryOp(Expr):
     operand: Expr
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Call(Expr):
     """Function/subroutine call expression.
 
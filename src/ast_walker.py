@@ -1,11 +1,52 @@
 """Simple AST walker that yields all nodes in the tree."""
 
-from collections.abc import Iterator
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Any, Final
 
 from src.ast_nodes import *
 
+# Shared empty skip set for the common no-skip case
+_NO_SKIP: Final[frozenset[type[ASTNode]]] = frozenset()
 
-def walk(node: ASTNode, skip: list[type[ASTNode]] | None = None) -> Iterator[ASTNode]:
+# Node types to skip exploring: a list, any other iterable, or a prebuilt frozenset
+SkipTypes = Iterable[type[ASTNode]]
+
+
+def _skip_set(skip: SkipTypes | None) -> frozenset[type[ASTNode]]:
+    """Freeze the skip types once per walk, reusing a frozenset that is passed in."""
+    if not skip:
+        return _NO_SKIP
+    return skip if isinstance(skip, frozenset) else frozenset(skip)
+
+
+# Maps each composite node type to a function returning its direct children in source
+# order. Children are read from the node's fields on every visit, so nodes whose bodies
+# are changed after construction are still walked correctly. Types missing from the
+# table (the leaf nodes) have no children.
+_CHILDREN: Final[dict[type[ASTNode], Callable[[Any], Sequence[ASTNode]]]] = {
+    Program: lambda n: n.top_level,
+    SubroutineDef: lambda n: n.body,
+    Assignment: lambda n: (n.value,),
+    Print: lambda n: (n.value,),
+    Println: lambda n: (n.value,),
+    ReturnStmt: lambda n: (n.expr,) if n.expr else (),
+    CallStmt: lambda n: (n.call,),
+    IfStmt: lambda n: (n.condition, *n.then_body, *(n.else_body or ())),
+    WhileLoop: lambda n: (n.condition, *n.body),
+    ForLoop: lambda n: (n.init_value, n.condition, n.update_value, *n.body),
+    BinOp: lambda n: (n.left, n.right),
+    UnaryOp: lambda n: (n.operand,),
+    Call: lambda n: n.args,
+}
+
+
+def children(node: ASTNode) -> Sequence[ASTNode]:
+    """Return a node's direct children in source order (empty for leaf nodes)."""
+    accessor = _CHILDREN.get(type(node))
+    return accessor(node) if accessor else ()
+
+
+def walk(node: ASTNode, skip: SkipTypes | None = None) -> Iterator[ASTNode]:
     """
     Walk an AST and yield every node in pre-order.
 
@@ -14,8 +55,9 @@ def walk(node: ASTNode, skip: list[type[ASTNode]] | None = None) -> Iterator[AST
 
     Args:
         node: The root node to start walking from
-        skip: Optional list of node types to skip exploring. If a node matches any of these types,
-              it won't be yielded and its children won't be visited.
+        skip: Optional node types to skip exploring (a list or any iterable; a frozenset
+              is used as-is). If a node's exact type is one of these, it won't be yielded
+              and its children won't be visited. Subclasses are not matched.
 
     Example:
         for node in walk(program):
@@ -26,80 +68,92 @@ def walk(node: ASTNode, skip: list[type[ASTNode]] | None = None) -> Iterator[AST
         for node in walk(program, skip=[SubroutineDef, ReturnStmt]):
             print(type(node).__name__)
     """
-    # Initialize skip list if not provided
-    if skip is None:
-        skip = []
+    skip_types = _skip_set(skip)
+
+    # Explicit LIFO stack instead of recursive generators: children are pushed in
+    # reverse so they are popped (and yielded) in source order, keeping pre-order
+    stack: list[ASTNode] = [node]
+    pop, extend, accessors = stack.pop, stack.extend, _CHILDREN
+    while stack:
+        current = pop()
+
+        # Skip this node and its children if it matches the skip types
+        kind = type(current)
+        if kind in skip_types:
+            continue
+
+        yield current
+        if kind in accessors:
+            extend(reversed(accessors[kind](current)))
+
+
+def walk_of(
+    node: ASTNode, *types: type[ASTNode], skip: SkipTypes | None = None
+) -> Iterator[ASTNode]:
+    """
+    Walk an AST and yield only the nodes that are instances of the given types.
+
+    Traversal order and skip semantics are the same as walk(), but filtering happens
+    inside the walker so uninteresting nodes are never handed back to the caller.
+
+    Args:
+        node: The root node to start walking from
+        *types: Node types to yield (matched with isinstance)
+        skip: Optional node types to skip exploring, as in walk()
 
-    # Skip this node and its children if it matches the skip types
-    if skip and type(node) in skip:
+    Example:
+        for node in walk_of(program, Assignment, Var):
+            print(node.name)
+    """
+    stack: list[ASTNode] = [node]
+    pop, extend, accessors = stack.pop, stack.extend, _CHILDREN
+
+    if not skip:  # Nothing can be skipped, so there is no need to check every node
+        while stack:
+            current = pop()
+            if isinstance(current, types):
+                yield current
+            kind = type(current)
+            if kind in accessors:
+                extend(reversed(accessors[kind](current)))
         return
 
-    # Yield the current node
-    yield node
-
-    # Then yield all children
-    match node:
-        case Program(top_level=items):
-            for item in items:
-                yield from walk(item, skip)
-
-        case SubroutineDef(body=body):
-            for stmt in body:
-                yield from walk(stmt, skip)
-
-        case Assignment(value=value):
-            yield from walk(value, skip)
-
-        case Print(value=value):
-            yield from walk(value, skip)
-
-        case Println(value=value):
-            yield from walk(value, skip)
-
-        case ReturnStmt(expr=expr):
-            if expr:
-                yield from walk(expr, skip)
-
-        case Break() | Continue():
-            # Leaf nodes - no children to traverse
-            pass
-
-        case CallStmt(call=call):
-            yield from walk(call, skip)
-
-        case IfStmt(condition=condition, then_body=then_body, else_body=else_body):
-            yield from walk(condition, skip)
-            for stmt in then_body:
-                yield from walk(stmt, skip)
-            if else_body:
-                for stmt in else_body:
-                    yield from walk(stmt, skip)
-
-        case WhileLoop(condition=condition, body=body):
-            yield from walk(condition, skip)
-            for stmt in body:
-                yield from walk(stmt, skip)
-
-        case ForLoop(
-            init_value=init_value, condition=condition, update_value=update_value, body=body
-        ):
-            yield from walk(init_value, skip)
-            yield from walk(condition, skip)
-            yield from walk(update_value, skip)
-            for stmt in body:
-                yield from walk(stmt, skip)
-
-        case BinOp(left=left, right=right):
-            yield from walk(left, skip)
-            yield from walk(right, skip)
-
-        case UnaryOp(operand=operand):
-            yield from walk(operand, skip)
-
-        case Call(args=args):
-            for arg in args:
-                yield from walk(arg, skip)
-
-        case Var() | Number() | String():
-            # Leaf nodes - no children
-            pass
+    skip_types = _skip_set(skip)
+    while stack:
+        current = pop()
+        kind = type(current)
+        if kind in skip_types:
+            continue
+
+        if isinstance(current, types):
+            yield current
+        if kind in accessors:
+            extend(reversed(accessors[kind](current)))
+
+
+def find_first(
+    node: ASTNode,
+    predicate: Callable[[ASTNode], bool],
+    skip: SkipTypes | None = None,
+) -> ASTNode | None:
+    """
+    Return the first node, in walk() order, for which the predicate is true.
+
+    The walk stops at the first match, so quick queries such as "does this subroutine
+    contain a call?" do not visit the rest of the tree.
+
+    Args:
+        node: The root node to start walking from
+        predicate: Function deciding whether a node is the one being looked for
+        skip: Optional node types to skip exploring, as in walk()
+
+    Returns:
+        The first matching node, or None if no node matches.
+
+    Example:
+        first_return = find_first(subroutine, lambda n: type(n) is ReturnStmt)
+    """
+    for current in walk(node, skip):
+        if predicate(current):
+            return current
+    return None
@@ -4,18 +4,26 @@
 import argparse
 import sys
 import traceback
+from collections.abc import Iterable
 from pathlib import Path
 
 from src.compiler import Compiler
-from src.parser import Parser
+from src.parser import Parser, get_parser
 
 
-def compile_file(input_file: str, output_file: str) -> None:
+def compile_file(
+    input_file: str,
+    output_file: str,
+    parser: Parser | None = None,
+    compiler: Compiler | None = None,
+) -> None:
     """Compile a toy source file to assembly.
 
     Args:
         input_file: Path to the .toy source file
         output_file: Path to write the .asm assembly file
+        parser: Optional parser to use; the shared one (see get_parser) if None
+        compiler: Optional compiler to reuse (it is reset first); a new one if None
     """
     input_path = Path(input_file)
     output_path = Path(output_file)
@@ -34,7 +42,8 @@ def compile_file(input_file: str, output_file: str) -> None:
 
     # Parse
     try:
-        parser = Parser()
+        if parser is None:
+            parser = get_parser()
         ast = parser.parse(source, filename=str(input_path))
     except Exception as e:
         print(f"Parse error in '{input_file}':", file=sys.stderr)
@@ -45,8 +54,14 @@ def compile_file(input_file: str, output_file: str) -> None:
 
     # Compile
     try:
-        compiler = Compiler()
-        asm = compiler.compile(ast)
+        if compiler is None:
+            compiler = Compiler()
+        else:
+            compiler.reset()
+        compiler.program(ast)
+        # Optimize and render the sections before the output file is opened, so a
+        # failure here cannot leave a truncated file behind
+        sections = compiler.render_sections()
     except Exception as e:
         print(f"Compilation error in '{input_file}':", file=sys.stderr)
         print(f"  {type(e).__name__}: {e}", file=sys.stderr)
@@ -59,15 +74,39 @@ def compile_file(input_file: str, output_file: str) -> None:
 
     # Write assembly output
     try:
-        output_path.write_text(asm)
+        with output_path.open("w") as out:
+            compiler.write_output(out, sections)
         print(f"Generated: {output_file}")
     except Exception as e:
         print(f"Error writing '{output_file}': {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def main():
-    """Main entry point for CLI."""
+def compile_batch(inputs: Iterable[tuple[str, str]]) -> list[str]:
+    """Compile several toy source files, sharing one parser and one compiler.
+
+    A file that fails to compile is reported (see compile_file) and skipped, and
+    the remaining files are still compiled.
+
+    Args:
+        inputs: (input .toy path, output .asm path) pairs to compile in order
+
+    Returns:
+        The input paths that failed to compile, in order
+    """
+    parser = get_parser()
+    compiler = Compiler()
+    failed = []
+    for input_file, output_file in inputs:
+        try:
+            compile_file(input_file, output_file, parser, compiler)
+        except SystemExit:
+            failed.append(input_file)  # compile_file has already reported the error
+    return failed
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
     parser = argparse.ArgumentParser(
         description="Compile toy language source to x86-64 assembly",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -75,6 +114,7 @@ def main():
 Examples:
   %(prog)s input.toy output.asm
   %(prog)s examples/arithmetic.toy build/arithmetic.asm
+  %(prog)s a.toy build/a.asm --also b.toy build/b.asm
         """,
     )
 
@@ -82,8 +122,23 @@ Examples:
 
     parser.add_argument("output", help="Output .asm assembly file")
 
-    args = parser.parse_args()
-    compile_file(args.input, args.output)
+    parser.add_argument(
+        "--also",
+        nargs=2,
+        action="append",
+        metavar=("INPUT", "OUTPUT"),
+        help="Also compile INPUT to OUTPUT in the same run (may be repeated)",
+    )
+
+    return parser
+
+
+def main():
+    """Main entry point for CLI."""
+    args = build_arg_parser().parse_args()
+    inputs = [(args.input, args.output), *map(tuple, args.also or ())]
+    if compile_batch(inputs):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
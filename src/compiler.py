@@ -1,27 +1,41 @@
 """Compiler for the toy language.
 
 This module provides a compiler that translates toy language AST nodes into x86-64 assembly.
-The compiler uses a stack-based approach for expression evaluation and maintains frame
-pointers for variable management across nested scopes (main program and subroutines).
+Expressions are evaluated into rax, spilling to the stack only when both operands of an
+operator need computing, and the compiler maintains frame pointers for variable
+management across nested scopes (main program and subroutines).
 
 The generated assembly follows the System V AMD64 ABI calling convention.
 """
 
+import io
+from collections import ChainMap
+from collections.abc import Callable, Iterator, Mapping
 from dataclasses import dataclass, field
-from typing import Literal
+from itertools import count
+from textwrap import dedent
+from typing import Any, Final, Literal, TextIO
 
+from src import peephole
 from src.asm_writer import SectionWriter
 from src.ast_nodes import *
-from src.var_utils import collect_program_variables, collect_subroutine_local_variables
+from src.constant_folding import fold_program
+from src.var_utils import (
+    BYTES_PER_QWORD,
+    REGISTER_PARAM_COUNT,
+    build_program_frame,
+    build_subroutine_frame,
+)
 
 # ============================================================================
 # Assembly Templates
 # ============================================================================
 # These templates are formatted strings that generate x86-64 assembly code.
-# They use Python's str.format() for variable substitution.
+# They use Python's str.format() for variable substitution. Each template is dedented
+# and split into lines once at import time (see template_lines / Compiler.emit_template).
 
 # --- Program Structure ---
-ASM_TEXT_HEADER = """
+ASM_TEXT_HEADER: Final[str] = """
 global _start
 extern print_int
 extern print_newline
@@ -30,25 +44,26 @@ _start:
 """
 
 # --- Data Section ---
-ASM_DATA_STRING = """
+ASM_DATA_STRING: Final[str] = """
 ; "{value}"
 {label}: db "{value}"
 {label}_len equ $ - {label}
 """
 
 # --- Stack Frame Management ---
-ASM_FRAME_SETUP = """
+ASM_FRAME_SETUP: Final[str] = """
 ; Set up stack frame
 push rbp            ; Save caller's frame pointer
 mov rbp, rsp        ; Establish new frame pointer
 """
 
-ASM_VAR_ALLOC = """
-; Allocate space for variables: {vars}
+# The variables themselves are listed one per line by the layout comment before this
+ASM_VAR_ALLOC: Final[str] = """
+; Allocate space for variables
 sub rsp, {byte_count}         ; Reserve {byte_count} bytes ({var_count} qwords) on stack
 """
 
-ASM_VAR_DEALLOC = """
+ASM_VAR_DEALLOC: Final[str] = """
 ; Clean up and exit program
 mov rsp, rbp        ; Restore stack pointer to frame base
 pop rbp             ; Restore base pointer
@@ -60,23 +75,25 @@ syscall             ; Invoke kernel to exit
 """
 
 # --- Statements ---
-ASM_ASSIGNMENT = """
-pop rax
+# Expression results arrive in rax (see Compiler.expr)
+# Like the leaf templates below, spelled at its call site (Compiler.store_rax) from the
+# frame's prebuilt memory operands rather than formatted per assignment.
+ASM_ASSIGNMENT: Final[str] = """
 mov qword [rbp{offset:+d}], rax
 """
 
-ASM_PRINT_INT = """
-pop rdi
+ASM_PRINT_INT: Final[str] = """
+mov rdi, rax
 call print_int
 """
 
-ASM_PRINTLN_INT = """
-pop rdi
+ASM_PRINTLN_INT: Final[str] = """
+mov rdi, rax
 call print_int
 call print_newline
 """
 
-ASM_PRINT_STRING = """
+ASM_PRINT_STRING: Final[str] = """
 mov rax, 1            ; write syscall
 mov rdi, 1            ; stdout file descriptor
 mov rsi, {label}      ; string buffer address
@@ -84,7 +101,7 @@ mov rdx, {label}_len  ; string length
 syscall
 """
 
-ASM_PRINTLN_STRING = """
+ASM_PRINTLN_STRING: Final[str] = """
 mov rax, 1            ; write syscall
 mov rdi, 1            ; stdout file descriptor
 mov rsi, {label}      ; string buffer address
@@ -93,130 +110,135 @@ syscall
 call print_newline
 """
 
-ASM_PRINT_NEWLINE = "call print_newline"
+ASM_PRINT_NEWLINE: Final[str] = "call print_newline"
 
 # --- Expressions: Literals and Variables ---
-ASM_PUSH_NUMBER = "push qword {num}"
+# Single-field, single-line templates (these three, ASM_JMP and ASM_LABEL) document the
+# emitted form; the compiler spells them as f-strings at the call sites instead of
+# paying for str.format() on every leaf and label.
+ASM_LOAD_NUMBER: Final[str] = "mov rax, {num}"
 
-ASM_PUSH_VAR = "push qword [rbp{offset:+d}]"
+ASM_LOAD_VAR: Final[str] = "mov rax, qword [rbp{offset:+d}]"
+
+ASM_PUSH_ARG: Final[str] = "push qword {operand}"
 
 # --- Expressions: Unary Operators ---
-ASM_UNARYOP_NOT = """
-pop rax          ; Operand
+ASM_UNARYOP_NOT: Final[str] = """
 test rax, rax    ; Set flags based on rax
 sete al          ; Set al to 1 if rax was 0, else 0
 movzx rax, al    ; Zero-extend al to rax
-push qword rax   ; Push result
 """
 
-ASM_UNARYOP_NEG = """
-pop rax          ; Operand
+ASM_UNARYOP_NEG: Final[str] = """
 neg rax          ; rax = -rax
-push qword rax   ; Push result
 """
 
+# --- Expressions: Binary Operators ---
+# The left operand is in rax; {operand} is the right operand: an immediate, a variable's
+# memory operand, or rcx when the right operand had to be computed (see ASM_BINOP_SPILL)
+
 # --- Expressions: Binary Operators (Logical) ---
-ASM_BINOP_AND = """
+# && and || short-circuit: the right operand is only evaluated when the left one does
+# not decide the result. Both paths meet at the end label with the flags of the
+# deciding operand's test, from which the 0/1 result is taken.
+ASM_LOGICAL_AND_TEST: Final[str] = """
 ; Logical and operation
-pop rbx             ; Second operand
-pop rax             ; First operand
-and rax, rbx        ; rax = rax && rbx
-push qword rax      ; Push result
+test rax, rax       ; A false left operand decides the result
+jz {label}          ; Skip the right operand (ZF=1 gives 0)
 """
 
-ASM_BINOP_OR = """
+ASM_LOGICAL_OR_TEST: Final[str] = """
 ; Logical or operation
-pop rbx             ; Second operand
-pop rax             ; First operand
-or rax, rbx         ; rax = rax || rbx
-push qword rax      ; Push result
+test rax, rax       ; A true left operand decides the result
+jnz {label}         ; Skip the right operand (ZF=0 gives 1)
+"""
+
+ASM_LOGICAL_RIGHT_TEST: Final[str] = "test rax, rax       ; Right operand decides the result"
+
+ASM_LOGICAL_RESULT: Final[str] = """
+setne al            ; Set al to 1 if the deciding operand was non-zero, else 0
+movzx rax, al       ; Zero-extend al to rax (result is 0 or 1)
 """
 
 # --- Expressions: Binary Operators (Arithmetic) ---
-ASM_BINOP_ADD = """
+ASM_BINOP_ADD: Final[str] = """
 ; Addition operation
-pop rbx             ; Second operand
-pop rax             ; First operand
-add rax, rbx        ; rax = rax + rbx
-push qword rax      ; Push result
+add rax, {operand}  ; rax = rax + operand
 """
 
-ASM_BINOP_SUB = """
+ASM_BINOP_SUB: Final[str] = """
 ; Subtraction operation
-pop rbx             ; Second operand (subtrahend)
-pop rax             ; First operand (minuend)
-sub rax, rbx        ; rax = rax - rbx
-push qword rax      ; Push result
+sub rax, {operand}  ; rax = rax - operand (rax is the minuend)
 """
 
-ASM_BINOP_MUL = """
+ASM_BINOP_MUL: Final[str] = """
 ; Multiplication operation
-pop rbx             ; Second operand
-pop rax             ; First operand
-imul rax, rbx       ; rax = rax * rbx (signed multiply)
-push qword rax      ; Push result
+imul rax, {operand} ; rax = rax * operand (signed multiply)
 """
 
-ASM_BINOP_DIV = """
+ASM_BINOP_DIV: Final[str] = """
 ; Division operation
-pop rbx             ; Divisor
-pop rax             ; Dividend
-cqo                 ; Sign-extend rax into rdx:rax
-idiv rbx            ; rax = rdx:rax / rbx (signed divide), rdx = remainder
-push qword rax      ; Push quotient
+cqo                 ; Sign-extend rax (dividend) into rdx:rax
+idiv {operand}      ; rax = rdx:rax / operand (signed divide), rdx = remainder
 """
 
 # --- Expressions: Binary Operators (Comparison) ---
-ASM_BINOP_CMP = """
+ASM_BINOP_CMP: Final[str] = """
 ; Comparison operation
-pop rbx             ; Second operand
-pop rax             ; First operand
-cmp rax, rbx        ; Compare rax with rbx (sets flags)
+cmp rax, {operand}  ; Compare rax with operand (sets flags)
 set{condition} al   ; Set al to 1 if condition true, 0 otherwise
 movzx rax, al       ; Zero-extend al to rax (result is 0 or 1)
-push qword rax      ; Push boolean result as integer
 """
 
+# Saving the left operand while a non-leaf right operand is computed into rax
+ASM_BINOP_SAVE_LEFT: Final[str] = "push rax            ; Save left operand"
+
+ASM_BINOP_SPILL: Final[str] = """
+mov rcx, rax        ; Right operand
+pop rax             ; Restore left operand
+"""
+
+# Loading a right operand that cannot be encoded in the instruction itself
+ASM_LOAD_RIGHT: Final[str] = "mov rcx, {operand}"
+
 # --- Control Flow ---
-ASM_CONDITION_CHECK = """
+ASM_CONDITION_CHECK: Final[str] = """
 ; Conditional branch
-pop rax             ; Get condition value
 cmp rax, 0          ; Test if false (zero)
 je {label}          ; Jump if zero (false condition)
 """
 
-ASM_JMP = "jmp {label}"
+ASM_JMP: Final[str] = "jmp {label}"
 
-ASM_LABEL = "{label}:"
+ASM_LABEL: Final[str] = "{label}:"
 
 # --- Subroutines ---
-ASM_RETURN = """
-; Return from subroutine with value
-pop rax             ; Get return value into rax register
+ASM_RETURN: Final[str] = """
+; Return from subroutine with value in rax
 mov rsp, rbp        ; Restore stack pointer
 pop rbp             ; Restore caller's frame pointer
 ret                 ; Return to caller
 """
 
-ASM_IMPLICIT_RETURN = """
+ASM_IMPLICIT_RETURN: Final[str] = """
 ; Implicit return (no explicit return statement)
 mov rsp, rbp        ; Restore stack pointer
 pop rbp             ; Restore caller's frame pointer
 ret                 ; Return to caller
 """
 
-ASM_CALL_SUB = """
-call sub_{name}.start       ; Call subroutine
-add rsp, {byte_count}       ; Clean up {byte_count} bytes of arguments from stack
-push qword rax              ; Save return value on stack
+ASM_CALL_SUB: Final[str] = """
+call sub_{name}.start       ; Call subroutine (return value in rax)
 """
 
-ASM_DISCARD_RETURN = "pop rax             ; Discard unused return value"
+ASM_CALL_CLEANUP: Final[str] = """
+add rsp, {byte_count}       ; Clean up {byte_count} bytes of stack arguments
+"""
 
-# Constants for stack layout
-BYTES_PER_QWORD = 8  # Each 64-bit value occupies 8 bytes on the stack
-PARAM_OFFSET_START = 2  # Parameter indexing starts at 2 qwords (16 bytes) above rbp
-# This skips: saved rbp (at rbp+0) and return address (at rbp+8)
+# Registers holding the first arguments of a call, in order (System V AMD64 ABI);
+# further arguments are passed on the stack
+ARG_REGISTERS: Final[tuple[str, ...]] = ("rdi", "rsi", "rdx", "rcx", "r8", "r9")
+assert len(ARG_REGISTERS) == REGISTER_PARAM_COUNT
 
 # Mapping from comparison operators to x86 condition codes
 # These are used with the SETcc instruction to convert comparison results to boolean values
@@ -229,8 +251,86 @@ COMPARISON_CONDITIONS = {
     BinOpType.GE: "ge",  # Greater than or Equal (signed)
 }
 
+# Code emitted for each arithmetic and comparison operator, indexed by BinOpType value.
+# The logical operators come last in BinOpType and have their own code path.
+LOGICAL_OPS: Final[frozenset[BinOpType]] = frozenset((BinOpType.AND, BinOpType.OR))
+
+BINOP_TEMPLATES: tuple[str, ...] = tuple(
+    {
+        BinOpType.ADD: ASM_BINOP_ADD,
+        BinOpType.SUB: ASM_BINOP_SUB,
+        BinOpType.MUL: ASM_BINOP_MUL,
+        BinOpType.DIV: ASM_BINOP_DIV,
+        **{
+            # Comparison operators produce boolean results (0 or 1); the condition is
+            # filled in here, leaving only {operand} for emission time
+            op: ASM_BINOP_CMP.replace("{condition}", condition)
+            for op, condition in COMPARISON_CONDITIONS.items()
+        },
+    }[op]
+    for op in BinOpType
+    if op not in LOGICAL_OPS
+)
+
+
+def fits_imm32(value: int) -> bool:
+    """Whether a literal can be encoded as a (sign-extended 32-bit) instruction immediate."""
+    return -(2**31) <= value < 2**31
+
+
+# Code emitted for each unary operator, indexed by UnaryOpType value
+UNARYOP_TEMPLATES: tuple[str, ...] = tuple(
+    {UnaryOpType.NEGATE: ASM_UNARYOP_NEG, UnaryOpType.NOT: ASM_UNARYOP_NOT}[op]
+    for op in UnaryOpType
+)
 
-@dataclass
+# Dedented, pre-split lines for each template, keyed by the template text
+_TEMPLATE_LINES: dict[str, tuple[str, ...]] = {}
+
+
+def template_lines(template: str) -> tuple[str, ...]:
+    """Return the dedented lines of an assembly template, splitting it only once.
+
+    Args:
+        template: A (possibly multi-line, indented) assembly template string.
+
+    Returns:
+        The template's lines with common indentation and surrounding blank lines removed.
+    """
+    lines = _TEMPLATE_LINES.get(template)
+    if lines is None:
+        lines = _TEMPLATE_LINES[template] = tuple(dedent(template).strip().split("\n"))
+    return lines
+
+
+def format_template(template: str, **fields: object) -> tuple[str, ...]:
+    """Return the lines of an assembly template with its placeholders filled in.
+
+    Only lines that contain a placeholder are formatted; the rest are returned as-is.
+
+    Args:
+        template: One of the ASM_* templates.
+        **fields: Values for the template's format placeholders.
+
+    Returns:
+        The formatted, dedented lines of the template.
+    """
+    lines = template_lines(template)
+    if not fields:
+        return lines
+    return tuple(line.format(**fields) if "{" in line else line for line in lines)
+
+
+# Split every template up front so emitting never has to dedent them
+for _template in (
+    *(value for name, value in globals().items() if name.startswith("ASM_")),
+    *BINOP_TEMPLATES,
+    *UNARYOP_TEMPLATES,
+):
+    template_lines(_template)
+
+
+@dataclass(slots=True)
 class LoopLabels:
     """Labels for a loop's control flow.
 
@@ -243,19 +343,31 @@ class LoopLabels:
     end: str
 
 
-@dataclass
+@dataclass(slots=True)
 class FrameMetadata:
     """Metadata for a single stack frame.
 
     Stores the mapping from variable names to their offsets from the frame pointer (rbp).
-    Positive offsets indicate parameters (above rbp), while negative offsets indicate
-    local variables (below rbp).
+    Positive offsets indicate stack parameters (above rbp), while negative offsets
+    indicate register parameters and local variables (below rbp).
+
+    A subroutine frame's offsets are a ChainMap over its parameter and local variable
+    offsets, so the two mappings are never merged into a new dict.
     """
 
-    var_offsets: dict[str, int]  # Maps variable name to its rbp-relative offset
+    var_offsets: Mapping[str, int]  # Maps variable name to its rbp-relative offset
     loop_label_stack: list[LoopLabels] = field(
         default_factory=list
     )  # Stack of loop labels for break/continue
+    # Maps variable name to its memory operand (e.g. "qword [rbp-8]"), built once per frame
+    var_operands: dict[str, str] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        offsets = self.var_offsets
+        maps = offsets.maps if isinstance(offsets, ChainMap) else (offsets,)
+        self.var_operands = {
+            var: f"qword [rbp{offset:+d}]" for mapping in maps for var, offset in mapping.items()
+        }
 
 
 class Compiler:
@@ -263,20 +375,29 @@ class Compiler:
 
     The compiler maintains a stack of frame metadata to handle nested scopes (main program
     and subroutines), generates unique labels for control flow, and emits assembly code
-    using a stack-based evaluation model.
+    that evaluates expressions into rax (see expr).
 
     Attributes:
         data: SectionWriter for the .data section
         text: SectionWriter for the .text section
         label_counter: Counter for generating unique labels for branches and loops
+            (an itertools.count, restarted by reset)
         frame_metadata_stack: Stack of FrameMetadata for the current compilation context
+        var_operands: Variable memory operands of the innermost frame, kept in step with
+            frame_metadata_stack so variable lookups are a single dict access
+        program_frames: Variable offsets of each Program compiled since the last reset
+        subroutine_frames: (parameter offsets, local offsets) of each SubroutineDef
+            compiled since the last reset
     """
 
     data: SectionWriter
     text_top: SectionWriter  # Main program code (emitted at top of text section)
     text_bottom: SectionWriter  # Subroutine code (emitted at bottom of text section)
-    label_counter: int
+    label_counter: Iterator[int]
     frame_metadata_stack: list[FrameMetadata]
+    var_operands: dict[str, str]
+    program_frames: dict[Program, dict[str, int]]
+    subroutine_frames: dict[SubroutineDef, tuple[dict[str, int], dict[str, int]]]
 
     def __init__(self):
         """Initialize the compiler with empty state.
@@ -288,11 +409,34 @@ class Compiler:
         This separation ensures subroutines appear after the main program in the
         final assembly output, improving readability.
         """
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all compilation state so the compiler can compile another program."""
         self.data = SectionWriter("data")
         self.text_top = SectionWriter("text")  # Section header included
         self.text_bottom = SectionWriter()  # No section header (appended to text_top)
-        self.label_counter = 0
+        self.label_counter = count()
         self.frame_metadata_stack = []
+        self.var_operands = {}
+        # Frames are kept here rather than on the nodes, which may be changed between
+        # compiles; each compile starts from a fresh (or reset) compiler
+        self.program_frames = {}
+        self.subroutine_frames = {}
+
+    def program_frame(self, program: Program) -> dict[str, int]:
+        """Return the variable offsets of a program, building them on first use."""
+        frame = self.program_frames.get(program)
+        if frame is None:
+            frame = self.program_frames[program] = build_program_frame(program)
+        return frame
+
+    def subroutine_frame(self, subroutine: SubroutineDef) -> tuple[dict[str, int], dict[str, int]]:
+        """Return the (parameter, local) offsets of a subroutine, building them on first use."""
+        frame = self.subroutine_frames.get(subroutine)
+        if frame is None:
+            frame = self.subroutine_frames[subroutine] = build_subroutine_frame(subroutine)
+        return frame
 
     def emit(
         self,
@@ -312,26 +456,11 @@ class Compiler:
         Raises:
             ValueError: If mode or section has an invalid value.
         """
-        # Validate section parameter
-        if section not in ("text", "data"):
-            raise ValueError(f"Invalid section '{section}': must be 'text' or 'data'")
-
         # Validate mode parameter
         if mode not in ("indented", "raw"):
             raise ValueError(f"Invalid mode '{mode}': must be 'indented' or 'raw'")
 
-        # Select the appropriate section writer based on section and current context
-        if section == "data":
-            # Data section: string literals and constants
-            writer = self.data
-        elif len(self.frame_metadata_stack) <= 1:
-            # Main program context (frame_metadata_stack has 0 or 1 frames)
-            # Emit to top of text section (includes section header and _start)
-            writer = self.text_top
-        else:
-            # Subroutine context (frame_metadata_stack has 2+ frames)
-            # Emit to bottom of text section (subroutine definitions)
-            writer = self.text_bottom
+        writer = self.get_writer(section)
 
         # Emit using the appropriate mode
         if mode == "indented":
@@ -339,6 +468,87 @@ class Compiler:
         else:  # mode == "raw"
             writer.emit_raw(code)
 
+    def emit_lines(self, *lines: str, section: Literal["text", "data"] = "text") -> None:
+        """Emit already-split, already-normalized lines of code to the specified section.
+
+        Unlike emit(), no dedenting, splitting or stripping is performed, so consecutive
+        instructions, comments and blank lines can be written as one cheap batch.
+
+        Args:
+            *lines: Lines without surrounding whitespace; empty strings become blank lines.
+            section: Either 'text' (default) or 'data'.
+
+        Raises:
+            ValueError: If section has an invalid value.
+        """
+        self.get_writer(section).emit_lines(lines)
+
+    def blank_line(self, section: Literal["text", "data"] = "text") -> None:
+        """Separate the code emitted so far from the next code with one blank line.
+
+        Consecutive blank lines collapse into one (see SectionWriter.blank_line).
+
+        Args:
+            section: Either 'text' (default) or 'data'.
+
+        Raises:
+            ValueError: If section has an invalid value.
+        """
+        self.get_writer(section).blank_line()
+
+    def emit_label(self, label: str) -> None:
+        """Emit a label definition at column 0 of the current text section.
+
+        Args:
+            label: The label name, without the trailing colon.
+        """
+        self.get_writer().emit_line(f"{label}:", indent_level=0)
+
+    def emit_template(
+        self, template: str, section: Literal["text", "data"] = "text", **fields: object
+    ) -> None:
+        """Emit an assembly template, formatting only the lines that have placeholders.
+
+        The template's dedented lines are computed once (see template_lines), so this
+        avoids re-normalizing the template text on every emission.
+
+        Args:
+            template: One of the ASM_* templates.
+            section: Either 'text' (default) or 'data'.
+            **fields: Values for the template's format placeholders.
+
+        Raises:
+            ValueError: If section has an invalid value.
+        """
+        self.get_writer(section).emit_lines(format_template(template, **fields))
+
+    def get_writer(self, section: Literal["text", "data"] = "text") -> SectionWriter:
+        """Select the section writer for the given section and current context.
+
+        Args:
+            section: Either 'text' or 'data'.
+
+        Returns:
+            The data writer, or the text writer for the current scope.
+
+        Raises:
+            ValueError: If section has an invalid value.
+        """
+        # Validate section parameter
+        if section not in ("text", "data"):
+            raise ValueError(f"Invalid section '{section}': must be 'text' or 'data'")
+
+        if section == "data":
+            # Data section: string literals and constants
+            return self.data
+        if len(self.frame_metadata_stack) <= 1:
+            # Main program context (frame_metadata_stack has 0 or 1 frames)
+            # Emit to top of text section (includes section header and _start)
+            return self.text_top
+        # Subroutine context (frame_metadata_stack has 2+ frames)
+        # Emit to bottom of text section (subroutine definitions)
+        return self.text_bottom
+
     def get_current_frame(self) -> FrameMetadata:
         """Get the current stack frame metadata.
 
@@ -395,9 +605,8 @@ class Compiler:
             if_label, else_label, fi_label = self.fresh_label_group("if", "else", "fi")
             # Might produce: ("if.0", "else.0", "fi.0")
         """
-        counter = self.label_counter
-        self.label_counter += 1
-        return tuple(f"{prefix}.{counter}" for prefix in prefixes)
+        suffix = "." + str(next(self.label_counter))  # Formatted once for the group
+        return tuple([prefix + suffix for prefix in prefixes])
 
     def compile(self, program: Program) -> str:
         """Compile a Program AST node into x86-64 assembly code.
@@ -410,60 +619,91 @@ class Compiler:
             followed by text section.
         """
         self.program(program)
+        out = io.StringIO()
+        self.write_output(out)
+        return out.getvalue()
 
-        # Assemble sections in proper order: data, then text (main + subroutines)
-        # Filter out empty sections using a generator expression
-        sections = (
-            output
-            for writer in (self.data, self.text_top, self.text_bottom)
-            if (output := writer.get_output())
-        )
-        return "\n\n".join(sections)
+    def render_sections(self) -> list[str]:
+        """Return the text of each non-empty section of an already compiled program.
+
+        Sections are in output order (data, then text: main program and subroutines),
+        with the text sections run through the peephole optimizer. Rendering is kept
+        apart from writing so that a failure here happens before any output is written.
+        """
+        sections = []
+        for writer in (self.data, self.text_top, self.text_bottom):
+            if output := writer.get_output():
+                if writer is not self.data:
+                    output = peephole.optimize(output)
+                sections.append(output)
+        return sections
+
+    def write_output(self, out: TextIO, sections: list[str] | None = None) -> None:
+        """Write the assembly of an already compiled program to a text stream.
+
+        Sections are written one at a time, so the complete program text never has to
+        be joined into a single string.
+
+        Args:
+            out: Text stream (e.g. an open output file) to write the assembly to.
+            sections: Section texts from render_sections; rendered now if None.
+        """
+        if sections is None:
+            sections = self.render_sections()
+        # Separate non-empty sections with a blank line
+        separator = ""
+        for output in sections:
+            out.write(separator)
+            out.write(output)
+            separator = "\n\n"
 
     def program(self, program: Program) -> None:
         """Compile the main program (entry point).
 
         This method:
-        1. Collects all variables used in the main program scope
-        2. Sets up the stack frame with variable storage
-        3. Compiles all top-level items (statements and subroutine definitions)
-        4. Generates cleanup code and program exit
+        1. Folds constant expressions (see constant_folding.fold_constants)
+        2. Assigns a stack slot to every variable used in the main program scope
+        3. Sets up the stack frame with variable storage
+        4. Compiles all top-level items (statements and subroutine definitions)
+        5. Generates cleanup code and program exit
 
         Args:
             program: The Program AST node containing top-level items.
         """
-        # Collect all variables that will be used in the main program scope
-        vars = collect_program_variables(program)
-        var_count = len(vars)
-        byte_count = var_count * BYTES_PER_QWORD
+        # Evaluate literal-only arithmetic now rather than in the generated code
+        program = fold_program(program)
 
-        # Calculate stack offsets for each variable (negative offsets = below rbp)
-        # Variables are indexed: rbp-8, rbp-16, rbp-24, etc.
-        var_offsets = {var: (-((idx + 1) * BYTES_PER_QWORD)) for (idx, var) in enumerate(vars)}
+        # Collect all variables used in the main program scope and their stack offsets
+        # (negative offsets = below rbp): rbp-8, rbp-16, rbp-24, etc.
+        var_offsets = self.program_frame(program)
+        var_count = len(var_offsets)
+        byte_count = var_count * BYTES_PER_QWORD
 
         # Create frame metadata and push onto stack (this is the main program's frame)
         frame_metadata = FrameMetadata(var_offsets)
         self.frame_metadata_stack.append(frame_metadata)
+        self.var_operands = frame_metadata.var_operands
 
         # Emit program header (section declaration, entry point, external references)
-        self.emit(ASM_TEXT_HEADER, mode="raw")
-        self.emit("")
-
-        # Set up stack frame pointer for the main program
-        self.emit(ASM_FRAME_SETUP)
-        self.emit("")
-
-        # Emit variable layout comments for debugging and clarity
-        self.emit("; Variable layout (fixed offsets from rbp):")
-        for var, offset in var_offsets.items():
-            self.emit(f"; [rbp{offset:+d}] = {var}")
-        self.emit("")
-
-        # Allocate stack space for all main program variables
-        self.emit(
-            ASM_VAR_ALLOC.format(vars=", ".join(vars), byte_count=byte_count, var_count=var_count)
+        writer = self.get_writer()
+        writer.emit_raw(ASM_TEXT_HEADER)
+
+        # The rest of the prologue is written as one batch of lines:
+        # - set up stack frame pointer for the main program
+        # - variable layout comments for debugging and clarity
+        # - allocate stack space for all main program variables
+        writer.emit_lines(
+            (
+                "",
+                *template_lines(ASM_FRAME_SETUP),
+                "",
+                "; Variable layout (fixed offsets from rbp):",
+                *(f"; [rbp{offset:+d}] = {var}" for var, offset in var_offsets.items()),
+                "",
+                *format_template(ASM_VAR_ALLOC, byte_count=byte_count, var_count=var_count),
+            )
         )
-        self.emit("")
+        writer.blank_line()
 
         # Emit statements and subroutines
         # Subroutine definitions are emitted to text_bottom (after main program)
@@ -474,10 +714,10 @@ class Compiler:
                     self.compile_subroutine(item)
                 case Statement():
                     self.statement(item)
-                    self.emit("")
+                    self.blank_line()
 
         # Emit cleanup and exit: restore stack and terminate process
-        self.emit(ASM_VAR_DEALLOC.format(byte_count=byte_count))
+        self.emit_template(ASM_VAR_DEALLOC)
 
     def compile_subroutine(self, subroutine: SubroutineDef) -> None:
         """Compile a subroutine definition.
@@ -486,13 +726,18 @@ class Compiler:
         is appended after the main program. This ensures they don't execute during
         normal program flow and only execute when called.
 
-        Stack layout for subroutines:
-            [rbp+24] - third parameter
-            [rbp+16] - second parameter
-            [rbp+8]  - return address (pushed by CALL)
-            [rbp+0]  - saved rbp (pushed by this function)
-            [rbp-8]  - first local variable
-            [rbp-16] - second local variable
+        The first six parameters arrive in registers (rdi, rsi, rdx, rcx, r8, r9) and
+        are stored to stack slots by the prologue; any further ones are on the stack.
+
+        Stack layout for subroutines (with n register parameters):
+            [rbp+24]      - eighth parameter
+            [rbp+16]      - seventh parameter
+            [rbp+8]       - return address (pushed by CALL)
+            [rbp+0]       - saved rbp (pushed by this function)
+            [rbp-8]       - first parameter (stored from rdi)
+            [rbp-16]      - second parameter (stored from rsi)
+            ...
+            [rbp-8*(n+1)] - first local variable
             ...
 
         Args:
@@ -505,66 +750,58 @@ class Compiler:
         # Generate labels for subroutine entry and skip-over jump
         sub_start = f"sub_{name}.start"
 
-        # Collect local variables declared within the subroutine (parameters excluded)
-        body_vars = collect_subroutine_local_variables(subroutine)
-
-        # Calculate offsets for parameters (positive offsets, above rbp)
-        # First parameter is at rbp+16, second at rbp+24, etc.
-        param_offsets = {
-            var: ((idx + PARAM_OFFSET_START) * BYTES_PER_QWORD) for (idx, var) in enumerate(params)
-        }
-
-        # Calculate offsets for local variables (negative offsets, below rbp)
-        # First local at rbp-8, second at rbp-16, etc.
-        local_offsets = {
-            var: (-((idx + 1) * BYTES_PER_QWORD)) for (idx, var) in enumerate(body_vars)
-        }
-        local_var_count = len(local_offsets)
-        local_byte_count = local_var_count * BYTES_PER_QWORD
-
-        # Combine parameter and local variable offsets into one mapping
-        subroutine_var_offsets = param_offsets | local_offsets
-
-        # Push new frame metadata onto stack (subroutine has its own scope)
+        # Calculate offsets for parameters (register parameters get the first slots
+        # below rbp: rbp-8, rbp-16, etc.; stack parameters are above it: rbp+16, etc.)
+        # and for local variables declared within the subroutine (the following slots)
+        param_offsets, local_offsets = self.subroutine_frame(subroutine)
+        register_params = params[:REGISTER_PARAM_COUNT]
+        param_registers = ARG_REGISTERS[: len(register_params)]
+        stack_params = params[REGISTER_PARAM_COUNT:]
+        slot_count = len(register_params) + len(local_offsets)
+        slot_byte_count = slot_count * BYTES_PER_QWORD
+
+        # Push new frame metadata onto stack (subroutine has its own scope), looking
+        # variables up in the parameter offsets first and then the local ones
         # This causes emit() to route code to text_bottom instead of text_top
-        frame_metadata = FrameMetadata(subroutine_var_offsets)
+        frame_metadata = FrameMetadata(ChainMap(param_offsets, local_offsets))
         self.frame_metadata_stack.append(frame_metadata)
+        self.var_operands = frame_metadata.var_operands
 
         # Emit subroutine header (will be written to text_bottom section)
-        self.emit("")
-        self.emit(f"; ===== Subroutine: {name} =====")
-        self.emit(ASM_LABEL.format(label=sub_start), mode="raw")  # Entry point for CALL instruction
-
-        # Set up stack frame (save caller's rbp, establish new frame)
-        self.emit(ASM_FRAME_SETUP)
-        self.emit("")
-
-        # Emit variable layout comments for debugging
-        self.emit("; Subroutine stack layout (from high to low addresses):")
-
-        # Show parameters (positive offsets)
-        if params:
-            for var, offset in sorted(param_offsets.items(), key=lambda x: -x[1]):
-                self.emit(f";   [rbp{offset:+d}] = {var}")
-
-        # Show call frame (fixed locations)
-        self.emit(";   [rbp+8] = return address (pushed by CALL)")
-        self.emit(";   [rbp+0] = saved caller's rbp")
-
-        # Show local variables (negative offsets)
-        if body_vars:
-            for var, offset in sorted(local_offsets.items(), key=lambda x: -x[1]):
-                self.emit(f";   [rbp{offset:+d}] = {var}")
-
-        # Allocate stack space for local variables only (parameters already on stack)
-        self.emit(
-            ASM_VAR_ALLOC.format(
-                vars=", ".join(body_vars),
-                byte_count=local_byte_count,
-                var_count=local_var_count,
+        writer = self.get_writer()
+        writer.blank_line()
+        writer.emit_line(f"; ===== Subroutine: {name} =====")
+        writer.emit_line(f"{sub_start}:", indent_level=0)  # Entry point for CALL instruction
+
+        # The rest of the prologue is written as one batch of lines:
+        # - set up stack frame (save caller's rbp, establish new frame)
+        # - stack layout comments for debugging: stack parameters (positive offsets;
+        #   later parameters sit at higher addresses), the fixed call frame, then
+        #   register parameters and locals (negative offsets, already in descending
+        #   address order)
+        # - allocate stack space for register parameters and locals (stack parameters
+        #   are already on the stack) and store the register parameters there
+        writer.emit_lines(
+            (
+                *template_lines(ASM_FRAME_SETUP),
+                "",
+                "; Subroutine stack layout (from high to low addresses):",
+                *(f";   [rbp{param_offsets[var]:+d}] = {var}" for var in reversed(stack_params)),
+                ";   [rbp+8] = return address (pushed by CALL)",
+                ";   [rbp+0] = saved caller's rbp",
+                *(
+                    f";   [rbp{param_offsets[var]:+d}] = {var} (from {register})"
+                    for var, register in zip(register_params, param_registers, strict=True)
+                ),
+                *(f";   [rbp{offset:+d}] = {var}" for var, offset in local_offsets.items()),
+                *format_template(ASM_VAR_ALLOC, byte_count=slot_byte_count, var_count=slot_count),
+                *(
+                    f"mov {frame_metadata.var_operands[var]}, {register}"
+                    for var, register in zip(register_params, param_registers, strict=True)
+                ),
             )
         )
-        self.emit("")
+        writer.blank_line()
 
         # Compile subroutine body statements
         for statement in body:
@@ -572,274 +809,393 @@ class Compiler:
 
         # Add implicit return for subroutines that don't have explicit return statement
         # This ensures proper cleanup even if control reaches end of subroutine
-        self.emit(ASM_IMPLICIT_RETURN)
+        self.emit_template(ASM_IMPLICIT_RETURN)
 
         # Emit subroutine footer
-        self.emit("")
-        self.emit(f"; ===== End of {name} =====")
+        self.blank_line()
+        self.emit_lines(f"; ===== End of {name} =====")
 
         # Pop frame metadata (return to caller's scope)
         # After this, emit() will route back to text_top
         self.frame_metadata_stack.pop()
-        self.emit("")
+        self.var_operands = self.get_current_frame().var_operands
+        self.blank_line()
 
     def statement(self, statement: Statement) -> None:
         """Compile a statement.
 
-        Statements are compiled based on their type using pattern matching.
+        Statements are dispatched on their exact type through STATEMENT_HANDLERS,
+        a single dict lookup instead of a sequential structural match.
         Each statement type generates appropriate assembly code.
 
+        Nested bodies are compiled without recursion (see run_worklist): handlers of
+        compound statements are generators that yield each body statement in turn.
+
         Args:
             statement: The Statement AST node to compile.
 
         Raises:
             ValueError: If an unknown statement type is encountered.
         """
-        match statement:
-            case Assignment(name, expr):
-                # Evaluate expression (result left on stack)
-                self.expr(expr)
-                # Pop result and store in variable's memory location
-                offset = self.get_var_offset(name)
-                self.emit(ASM_ASSIGNMENT.format(offset=offset))
-                self.emit("")
-
-            case IfStmt(condition, then_body, else_body):
-                # Generate unique labels for if/else/fi branches
-                if_label, else_label, fi_label = self.fresh_label_group("if", "else", "fi")
-                self.emit("; If statement")
-                self.emit(ASM_LABEL.format(label=if_label), mode="raw")
-
-                # Evaluate condition (result left on stack as 0 or 1)
-                self.expr(condition)
-                self.emit("")
-
-                if else_body:
-                    # If-else: jump to else if condition is false
-                    self.emit(ASM_CONDITION_CHECK.format(label=else_label))
-
-                    # Compile then branch
-                    for statement in then_body:
-                        self.statement(statement)
-
-                    # Jump past else branch after completing then branch
-                    self.emit(ASM_JMP.format(label=fi_label))
-
-                    # Compile else branch
-                    self.emit("; Else branch")
-                    self.emit(ASM_LABEL.format(label=else_label), mode="raw")
-                    for statement in else_body:
-                        self.statement(statement)
-                else:
-                    # If-only: jump to end if condition is false
-                    self.emit(ASM_CONDITION_CHECK.format(label=fi_label))
-
-                    # Compile then branch
-                    for statement in then_body:
-                        self.statement(statement)
-
-                # End of if statement
-                self.emit("; End if")
-                self.emit(ASM_LABEL.format(label=fi_label), mode="raw")
-
-            case WhileLoop(condition, body):
-                # Generate unique labels for loop start and exit
-                while_label, done_label = self.fresh_label_group("while", "done")
-                self.push_loop_labels(while_label, done_label)
-                self.emit("; While loop")
-
-                # Loop entry point (condition check)
-                self.emit(ASM_LABEL.format(label=while_label), mode="raw")
-                self.expr(condition)
-                self.emit("")
-
-                # Exit loop if condition is false
-                self.emit(ASM_CONDITION_CHECK.format(label=done_label))
-
-                # Compile loop body
-                for statement in body:
-                    self.statement(statement)
-
-                # Jump back to condition check
-                self.emit(ASM_JMP.format(label=while_label))
-
-                # Loop exit point
-                self.emit("; End while")
-                self.emit(ASM_LABEL.format(label=done_label), mode="raw")
-
-                self.pop_loop_labels()
-
-            case ForLoop(init_var, init_value, condition, update_var, update_value, body):
-                # Generate unique labels for loop start, update, and exit
-                for_label, update_label, done_label = self.fresh_label_group(
-                    "for", "update", "done"
-                )
-                # Push update_label as the "start" for continue statements
-                self.push_loop_labels(update_label, done_label)
-                self.emit("; For loop")
-
-                # Initialize loop variable
-                self.expr(init_value)
-                offset = self.get_var_offset(init_var)
-                self.emit(ASM_ASSIGNMENT.format(offset=offset))
-
-                # Loop entry point (condition check)
-                self.emit(ASM_LABEL.format(label=for_label), mode="raw")
-                self.expr(condition)
-                self.emit("")
-
-                # Exit loop if condition is false
-                self.emit(ASM_CONDITION_CHECK.format(label=done_label))
-
-                # Compile loop body
-                for statement in body:
-                    self.statement(statement)
-
-                # Update section (continue jumps here)
-                self.emit(ASM_LABEL.format(label=update_label), mode="raw")
-                self.expr(update_value)
-                offset = self.get_var_offset(update_var)
-                self.emit(ASM_ASSIGNMENT.format(offset=offset))
-
-                # Jump back to condition check
-                self.emit(ASM_JMP.format(label=for_label))
-
-                # Loop exit point
-                self.emit("; End for")
-                self.emit(ASM_LABEL.format(label=done_label), mode="raw")
-
-                self.pop_loop_labels()
-
-            case Print(value):
-                # Print without newline
-                match value:
-                    case String(string_value):
-                        if not string_value:  # Empty string is a no-op
-                            return
-                        # Generate label only after confirming string is non-empty
-                        (label,) = self.fresh_label_group("const")
-                        self.emit(
-                            ASM_DATA_STRING.format(label=label, value=string_value),
-                            section="data",
-                        )
-                        self.emit("", section="data")
-                        self.emit(ASM_PRINT_STRING.format(label=label))
-                    case Expr():
-                        self.expr(value)
-                        self.emit(ASM_PRINT_INT)
-
-            case Println(value):
-                # Print with newline
-                match value:
-                    case String(string_value):
-                        if not string_value:  # Empty string: just print newline
-                            self.emit(ASM_PRINT_NEWLINE)
-                            return
-                        # Generate label only after confirming string is non-empty
-                        (label,) = self.fresh_label_group("const")
-                        self.emit(
-                            ASM_DATA_STRING.format(label=label, value=string_value),
-                            section="data",
-                        )
-                        self.emit("", section="data")
-                        self.emit(ASM_PRINTLN_STRING.format(label=label))
-                    case Expr():
-                        self.expr(value)
-                        self.emit(ASM_PRINTLN_INT)
-
-            case ReturnStmt(expr):
-                # Evaluate return expression and return from subroutine
-                self.expr(expr)
-                self.emit(ASM_RETURN)
-
-            case CallStmt(expr):
-                # Call subroutine expression (result pushed to stack)
-                self.expr(expr)
-                # Discard the return value since this is a statement, not expression
-                self.emit(ASM_DISCARD_RETURN)
-
-            case Continue():
-                # Jump to loop start (next iteration)
-                loop_labels = self.get_current_loop_labels()
-                self.emit("; Continue to next iteration")
-                self.emit(ASM_JMP.format(label=loop_labels.start))
-
-            case Break():
-                # Jump to loop end (exit loop)
-                loop_labels = self.get_current_loop_labels()
-                self.emit("; Break out of loop")
-                self.emit(ASM_JMP.format(label=loop_labels.end))
-
-            case other:
-                raise ValueError(f"Unexpected statement '{type(other).__name__}'")
+        self.run_worklist(statement, STATEMENT_HANDLERS, "statement")
+
+    def assignment(self, statement: Assignment) -> None:
+        """Compile an assignment: evaluate the value and store it in the variable's slot."""
+        # Evaluate expression (result in rax)
+        self.expr(statement.value)
+        # Store result in variable's memory location
+        self.store_rax(statement.name)
+        self.blank_line()
+
+    def store_rax(self, name: str) -> None:
+        """Store the value in rax (an evaluated expression) into a variable's slot."""
+        self.emit_lines(f"mov {self.var_operands[name]}, rax")
+
+    def if_stmt(self, statement: IfStmt) -> Iterator[Statement]:
+        """Compile an if statement with an optional else branch."""
+        # Generate unique labels for if/else/fi branches
+        if_label, else_label, fi_label = self.fresh_label_group("if", "else", "fi")
+        self.emit_lines("; If statement")
+        self.emit_label(if_label)
+
+        # Evaluate condition (result in rax as 0 or 1)
+        self.expr(statement.condition)
+        self.blank_line()
+
+        if statement.else_body:
+            # If-else: jump to else if condition is false
+            self.emit_template(ASM_CONDITION_CHECK, label=else_label)
+
+            # Compile then branch
+            yield from statement.then_body
+
+            # Jump past else branch after completing then branch
+            self.emit_lines(f"jmp {fi_label}")
+
+            # Compile else branch
+            self.emit_lines("; Else branch")
+            self.emit_label(else_label)
+            yield from statement.else_body
+        else:
+            # If-only: jump to end if condition is false
+            self.emit_template(ASM_CONDITION_CHECK, label=fi_label)
+
+            # Compile then branch
+            yield from statement.then_body
+
+        # End of if statement
+        self.emit_lines("; End if")
+        self.emit_label(fi_label)
+
+    def while_loop(self, statement: WhileLoop) -> Iterator[Statement]:
+        """Compile a while loop."""
+        # Generate unique labels for loop start and exit
+        while_label, done_label = self.fresh_label_group("while", "done")
+        self.push_loop_labels(while_label, done_label)
+        self.emit_lines("; While loop")
+
+        # Loop entry point (condition check)
+        self.emit_label(while_label)
+        self.expr(statement.condition)
+        self.blank_line()
+
+        # Exit loop if condition is false
+        self.emit_template(ASM_CONDITION_CHECK, label=done_label)
+
+        # Compile loop body
+        yield from statement.body
+
+        # Jump back to condition check, then the loop exit point
+        self.emit_lines(f"jmp {while_label}", "; End while")
+        self.emit_label(done_label)
+
+        self.pop_loop_labels()
+
+    def for_loop(self, statement: ForLoop) -> Iterator[Statement]:
+        """Compile a for loop (init; condition; update)."""
+        # Generate unique labels for loop start, update, and exit
+        for_label, update_label, done_label = self.fresh_label_group("for", "update", "done")
+        # Push update_label as the "start" for continue statements
+        self.push_loop_labels(update_label, done_label)
+        self.emit_lines("; For loop")
+
+        # Initialize loop variable
+        self.expr(statement.init_value)
+        self.store_rax(statement.init_var)
+
+        # Loop entry point (condition check)
+        self.emit_label(for_label)
+        self.expr(statement.condition)
+        self.blank_line()
+
+        # Exit loop if condition is false
+        self.emit_template(ASM_CONDITION_CHECK, label=done_label)
+
+        # Compile loop body
+        yield from statement.body
+
+        # Update section (continue jumps here)
+        self.emit_label(update_label)
+        self.expr(statement.update_value)
+        self.store_rax(statement.update_var)
+
+        # Jump back to condition check, then the loop exit point
+        self.emit_lines(f"jmp {for_label}", "; End for")
+        self.emit_label(done_label)
+
+        self.pop_loop_labels()
+
+    def print_stmt(self, statement: Print) -> None:
+        """Compile a print statement (no trailing newline)."""
+        value = statement.value
+        if isinstance(value, String):
+            if not value.value:  # Empty string is a no-op
+                return
+            # Generate label only after confirming string is non-empty
+            label = self.string_constant(value.value)
+            self.emit_template(ASM_PRINT_STRING, label=label)
+        else:
+            self.expr(value)
+            self.emit_template(ASM_PRINT_INT)
+
+    def println_stmt(self, statement: Println) -> None:
+        """Compile a println statement (value followed by a newline)."""
+        value = statement.value
+        if isinstance(value, String):
+            if not value.value:  # Empty string: just print newline
+                self.emit_lines(ASM_PRINT_NEWLINE)
+                return
+            # Generate label only after confirming string is non-empty
+            label = self.string_constant(value.value)
+            self.emit_template(ASM_PRINTLN_STRING, label=label)
+        else:
+            self.expr(value)
+            self.emit_template(ASM_PRINTLN_INT)
+
+    def string_constant(self, value: str) -> str:
+        """Emit a string literal into the data section and return its label."""
+        (label,) = self.fresh_label_group("const")
+        self.emit_template(ASM_DATA_STRING, section="data", label=label, value=value)
+        self.blank_line(section="data")
+        return label
+
+    def return_stmt(self, statement: ReturnStmt) -> None:
+        """Compile a return statement: evaluate the value and return from the subroutine."""
+        self.expr(statement.expr)
+        self.emit_template(ASM_RETURN)
+
+    def call_stmt(self, statement: CallStmt) -> None:
+        """Compile a call used as a statement, discarding its return value."""
+        # The return value is left unused in rax since this is a statement, not expression
+        self.expr(statement.call)
+
+    def continue_stmt(self, statement: Continue) -> None:
+        """Compile a continue statement: jump to the innermost loop's next iteration."""
+        loop_labels = self.get_current_loop_labels()
+        self.emit_lines("; Continue to next iteration", f"jmp {loop_labels.start}")
+
+    def break_stmt(self, statement: Break) -> None:
+        """Compile a break statement: jump past the end of the innermost loop."""
+        loop_labels = self.get_current_loop_labels()
+        self.emit_lines("; Break out of loop", f"jmp {loop_labels.end}")
 
     def expr(self, expr: Expr) -> None:
         """Compile an expression.
 
-        Expressions are compiled using a stack-based approach: operands are pushed
-        onto the stack, operators consume operands and push results. The final
-        result is always left on top of the stack.
+        The result is always left in rax. A binary operator whose right operand is a
+        Number or Var uses it directly as an instruction operand; otherwise the left
+        value is saved on the stack while the right operand is computed. Subroutine
+        arguments are still passed on the stack. Dispatch goes through EXPR_HANDLERS,
+        keyed by the exact node type.
+
+        Nested expressions are compiled without recursion (see run_worklist): handlers
+        of composite expressions are generators that yield each operand, in evaluation
+        order, and emit the code consuming it once it has been computed into rax.
 
         Args:
             expr: The Expr AST node to compile.
 
         Raises:
-            ValueError: If an unknown expression or operator type is encountered.
+            ValueError: If an unknown expression type is encountered.
         """
-        match expr:
-            case UnaryOp(op, operand):
-                match op:
-                    case UnaryOpType.NOT:
-                        self.expr(operand)
-                        self.emit(ASM_UNARYOP_NOT)
-                    case UnaryOpType.NEGATE:
-                        self.expr(operand)
-                        self.emit(ASM_UNARYOP_NEG)
-
-            case Number(num):
-                # Push literal number onto stack
-                self.emit(ASM_PUSH_NUMBER.format(num=num))
-
-            case Var(name):
-                # Look up variable's offset and push its value onto stack
-                offset = self.get_var_offset(name)
-                self.emit(ASM_PUSH_VAR.format(offset=offset))
-
-            case BinOp(op, left, right):
-                # Evaluate left operand (result on stack)
-                self.expr(left)
-                # Evaluate right operand (result on stack)
-                self.expr(right)
-
-                # Apply operator: pops operands, pushes result
-                match op:
-                    case BinOpType.AND:
-                        self.emit(ASM_BINOP_AND)
-                    case BinOpType.OR:
-                        self.emit(ASM_BINOP_OR)
-                    case BinOpType.ADD:
-                        self.emit(ASM_BINOP_ADD)
-                    case BinOpType.SUB:
-                        self.emit(ASM_BINOP_SUB)
-                    case BinOpType.MUL:
-                        self.emit(ASM_BINOP_MUL)
-                    case BinOpType.DIV:
-                        self.emit(ASM_BINOP_DIV)
-                    case _ if op in COMPARISON_CONDITIONS:
-                        # Comparison operators produce boolean results (0 or 1)
-                        self.emit(ASM_BINOP_CMP.format(condition=COMPARISON_CONDITIONS[op]))
-                    case _:
-                        raise ValueError(f"Unexpected operator '{op}'")
-
-            case Call(name, args):
-                # Push arguments in reverse order (rightmost first)
-                # This ensures correct left-to-right parameter ordering on stack
-                for arg in reversed(args):
-                    self.expr(arg)
-
-                # Call subroutine and clean up arguments from stack
-                # Result is placed in rax and then pushed onto stack
-                self.emit(ASM_CALL_SUB.format(name=name, byte_count=len(args) * 8))
-
-            case other:
-                raise ValueError(f"Unexpected expr '{type(other).__name__}'")
+        self.run_worklist(expr, EXPR_HANDLERS, "expr")
+
+    def run_worklist(self, node: ASTNode, handlers: "HandlerTable", kind: str) -> None:
+        """Compile a node and its nested nodes with an explicit worklist.
+
+        Handlers of leaf nodes emit their code directly and return None. Handlers of
+        composite nodes are generators: each yielded node is compiled before the
+        handler resumes, so deeply nested code costs no Python call depth.
+
+        Args:
+            node: The AST node to compile.
+            handlers: Compile methods keyed by exact node type.
+            kind: Node kind named in the error for an unknown node type.
+
+        Raises:
+            ValueError: If a node has no handler.
+        """
+        # Suspended composite handlers, innermost last
+        pending: list[Iterator[ASTNode]] = []
+        while True:
+            handler = handlers.get(type(node))
+            if handler is None:
+                raise ValueError(f"Unexpected {kind} '{type(node).__name__}'")
+            nested = handler(self, node)
+            if nested is not None:
+                pending.append(nested)
+
+            # Resume handlers until one yields another node to compile
+            while pending:
+                child = next(pending[-1], None)
+                if child is not None:
+                    node = child
+                    break
+                pending.pop()
+            else:
+                return
+
+    def unary_op(self, expr: UnaryOp) -> Iterator[Expr]:
+        """Compile a unary operation on the value of its operand."""
+        yield expr.operand
+        self.emit_template(UNARYOP_TEMPLATES[expr.op])
+
+    def number(self, expr: Number) -> None:
+        """Load a literal number into rax."""
+        self.emit_lines(f"mov rax, {expr.value}")
+
+    def var(self, expr: Var) -> None:
+        """Load a variable's value into rax."""
+        self.emit_lines(f"mov rax, {self.var_operands[expr.name]}")
+
+    def bin_op(self, expr: BinOp) -> Iterator[Expr]:
+        """Compile a binary operation: evaluate both operands, then apply the operator."""
+        if expr.op in LOGICAL_OPS:
+            yield from self.logical_op(expr)
+            return
+
+        # Evaluate left operand (result in rax)
+        yield expr.left
+
+        # A literal or variable right operand is used in place, without a stack round trip
+        right = self.leaf_operand(expr.right)
+        if right is None:
+            # Save the left value while the right operand is evaluated into rax
+            self.emit_lines(ASM_BINOP_SAVE_LEFT)
+            yield expr.right
+            self.emit_template(ASM_BINOP_SPILL)
+            right = "rcx"
+        elif type(expr.right) is Number and (
+            expr.op is BinOpType.DIV or not fits_imm32(expr.right.value)
+        ):
+            # idiv takes no immediate, and wide literals cannot be encoded in place
+            self.emit_template(ASM_LOAD_RIGHT, operand=right)
+            right = "rcx"
+
+        # Apply operator: rax = rax <op> right
+        self.emit_template(BINOP_TEMPLATES[expr.op], operand=right)
+
+    def logical_op(self, expr: BinOp) -> Iterator[Expr]:
+        """Compile && or || with short-circuit evaluation, leaving 0 or 1 in rax."""
+        is_and = expr.op is BinOpType.AND
+        (end_label,) = self.fresh_label_group("and_done" if is_and else "or_done")
+
+        # Evaluate left operand and skip the right one if it decides the result
+        yield expr.left
+        test = ASM_LOGICAL_AND_TEST if is_and else ASM_LOGICAL_OR_TEST
+        self.emit_template(test, label=end_label)
+
+        # Otherwise the right operand decides it
+        yield expr.right
+        self.emit_lines(ASM_LOGICAL_RIGHT_TEST)
+
+        self.emit_label(end_label)
+        self.emit_template(ASM_LOGICAL_RESULT)
+
+    def leaf_operand(self, expr: Expr) -> str | None:
+        """Return the assembly operand for a Number or Var, or None for other expressions.
+
+        Args:
+            expr: The expression to use as an instruction operand.
+
+        Returns:
+            An immediate ("42") or memory operand ("qword [rbp-8]"), or None.
+        """
+        if isinstance(expr, Number):
+            return str(expr.value)
+        if isinstance(expr, Var):
+            return self.var_operands[expr.name]
+        return None
+
+    def call(self, expr: Call) -> Iterator[Expr]:
+        """Compile a subroutine call, leaving its return value in rax.
+
+        The first arguments are passed in ARG_REGISTERS and the rest on the stack.
+        Arguments are evaluated from right to left.
+        """
+        args = expr.args
+        register_args = args[:REGISTER_PARAM_COUNT]
+        stack_args = args[REGISTER_PARAM_COUNT:]
+
+        # Push stack arguments in reverse order (rightmost first)
+        # This ensures correct left-to-right parameter ordering on stack
+        # Literal and variable arguments are pushed directly instead of via rax
+        for arg in reversed(stack_args):
+            if isinstance(arg, Var):
+                self.emit_lines(f"push {self.var_operands[arg.name]}")
+            elif isinstance(arg, Number) and fits_imm32(arg.value):
+                self.emit_lines(f"push qword {arg.value}")
+            else:
+                yield arg
+                self.emit_lines("push rax")
+
+        # Evaluate the remaining computed arguments. Evaluating one may clobber the
+        # argument registers, so all but the last one evaluated wait on the stack.
+        registers = ARG_REGISTERS[: len(register_args)]
+        computed = [
+            (arg, register)
+            for arg, register in zip(reversed(register_args), reversed(registers), strict=True)
+            if self.leaf_operand(arg) is None
+        ]
+        for index, (arg, register) in enumerate(computed, 1):
+            yield arg
+            self.emit_lines(f"mov {register}, rax" if index == len(computed) else "push rax")
+        for _, register in reversed(computed[:-1]):
+            self.emit_lines(f"pop {register}")
+
+        # Literal and variable arguments are loaded last, straight into their registers
+        for arg, register in zip(register_args, registers, strict=True):
+            operand = self.leaf_operand(arg)
+            if operand is not None:
+                self.emit_lines(f"mov {register}, {operand}")
+
+        # Call subroutine (result is left in rax) and clean up stack arguments
+        self.emit_template(ASM_CALL_SUB, name=expr.name)
+        if stack_args:
+            self.emit_template(ASM_CALL_CLEANUP, byte_count=len(stack_args) * BYTES_PER_QWORD)
+
+
+# Per-node-type compile methods, looked up by exact type in Compiler.statement/expr.
+# Handlers of compound nodes return a generator of nested nodes, see Compiler.run_worklist
+HandlerTable = dict[type, Callable[[Compiler, Any], Iterator[ASTNode] | None]]
+
+STATEMENT_HANDLERS: HandlerTable = {
+    Assignment: Compiler.assignment,
+    IfStmt: Compiler.if_stmt,
+    WhileLoop: Compiler.while_loop,
+    ForLoop: Compiler.for_loop,
+    Print: Compiler.print_stmt,
+    Println: Compiler.println_stmt,
+    ReturnStmt: Compiler.return_stmt,
+    CallStmt: Compiler.call_stmt,
+    Continue: Compiler.continue_stmt,
+    Break: Compiler.break_stmt,
+}
+
+EXPR_HANDLERS: HandlerTable = {
+    UnaryOp: Compiler.unary_op,
+    Number: Compiler.number,
+    Var: Compiler.var,
+    BinOp: Compiler.bin_op,
+    Call: Compiler.call,
+}
@@ -0,0 +1,272 @@
+"""Constant folding of expressions before code generation.
+
+Binary and unary operations whose operands are all literals are evaluated at compile
+time, with the same 64-bit wrapping and truncating division as the generated code, and
+a few algebraic identities are simplified:
+
+    x + 0, 0 + x, x - 0, x * 1, 1 * x, x / 1  ->  x
+    x * 0, 0 * x                               ->  0   (only if x has no side effects)
+    0 - x                                      ->  -x
+
+Logical operators fold when both operands are literals, or when a literal left operand
+decides the result on its own (0 && x, nonzero || x), in which case x is never
+evaluated, exactly as with short-circuit evaluation at run time. Division by zero and
+the one overflowing division are not folded, so they still fail at run time as before.
+
+Statements whose condition folds to a literal are pruned from the bodies that contain
+them: an if statement is replaced by the branch it always takes, and a while loop
+whose condition is 0 is dropped. For loops are kept, since their initialization runs
+regardless of the condition.
+
+The input tree is never modified: rewritten nodes are rebuilt with
+dataclasses.replace, and subtrees without anything to fold are returned unchanged.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import replace
+from operator import is_not
+from typing import Any, Final, cast
+
+from src.ast_nodes import *
+from src.ast_walker import children as children_of
+from src.ast_walker import find_first
+
+_WORD: Final[int] = 1 << 64
+_INT64_MIN: Final[int] = -(1 << 63)
+
+
+def wrap_int64(value: int) -> int:
+    """Wrap an integer to the signed 64-bit range, like the machine arithmetic does."""
+    return (value - _INT64_MIN) % _WORD + _INT64_MIN
+
+
+def eval_binop(op: BinOpType, left: int, right: int) -> int | None:
+    """Evaluate a binary operator on two literals.
+
+    Args:
+        op: The binary operator.
+        left: The left operand value.
+        right: The right operand value.
+
+    Returns:
+        The result as the generated code would compute it, or None if the operation
+        must be left to run time (division by zero or overflow).
+    """
+    match op:
+        case BinOpType.ADD:
+            return wrap_int64(left + right)
+        case BinOpType.SUB:
+            return wrap_int64(left - right)
+        case BinOpType.MUL:
+            return wrap_int64(left * right)
+        case BinOpType.DIV:
+            if right == 0 or (left == _INT64_MIN and right == -1):
+                return None  # idiv raises a divide error
+            # idiv truncates toward zero, unlike Python's floor division
+            quotient = abs(left) // abs(right)
+            return quotient if (left < 0) == (right < 0) else -quotient
+        case BinOpType.EQ:
+            return int(left == right)
+        case BinOpType.NE:
+            return int(left != right)
+        case BinOpType.LT:
+            return int(left < right)
+        case BinOpType.LE:
+            return int(left <= right)
+        case BinOpType.GT:
+            return int(left > right)
+        case BinOpType.GE:
+            return int(left >= right)
+        case BinOpType.AND:
+            return int(left != 0 and right != 0)
+        case BinOpType.OR:
+            return int(left != 0 or right != 0)
+    return None
+
+
+def has_side_effects(expr: Expr) -> bool:
+    """Whether evaluating an expression may do more than produce its value.
+
+    Calls can have side effects and division can fault, so dropping an expression
+    that contains either would change the program's behavior.
+    """
+    return find_first(expr, _has_side_effect) is not None
+
+
+def _has_side_effect(node: ASTNode) -> bool:
+    """Whether a node itself (ignoring its children) may have a side effect."""
+    return type(node) is Call or (type(node) is BinOp and node.op is BinOpType.DIV)
+
+
+def fold_binop(expr: BinOp, left: Expr, right: Expr) -> Expr:
+    """Fold a binary operation whose operands have already been folded."""
+    op = expr.op
+    left_value = left.value if type(left) is Number else None
+    right_value = right.value if type(right) is Number else None
+
+    if left_value is not None and right_value is not None:
+        value = eval_binop(op, left_value, right_value)
+        if value is not None:
+            return Number.of(value)
+    elif right_value is not None:
+        if right_value == 0 and op in (BinOpType.ADD, BinOpType.SUB):
+            return left
+        if right_value == 1 and op in (BinOpType.MUL, BinOpType.DIV):
+            return left
+        if right_value == 0 and op is BinOpType.MUL and not has_side_effects(left):
+            return Number.of(0)
+    elif left_value is not None:
+        # The right operand is never evaluated when the left one decides && or ||
+        if op is BinOpType.AND and left_value == 0:
+            return Number.of(0)
+        if op is BinOpType.OR and left_value != 0:
+            return Number.of(1)
+        if left_value == 0 and op is BinOpType.ADD:
+            return right
+        if left_value == 1 and op is BinOpType.MUL:
+            return right
+        if left_value == 0 and op is BinOpType.MUL and not has_side_effects(right):
+            return Number.of(0)
+        if left_value == 0 and op is BinOpType.SUB:
+            return UnaryOp(op=UnaryOpType.NEGATE, operand=right, location=expr.location)
+
+    if left is expr.left and right is expr.right:
+        return expr
+    return replace(expr, left=left, right=right)
+
+
+def fold_unaryop(expr: UnaryOp, operand: Expr) -> Expr:
+    """Fold a unary operation whose operand has already been folded."""
+    if type(operand) is Number:
+        if expr.op is UnaryOpType.NEGATE:
+            return Number.of(wrap_int64(-operand.value))
+        return Number.of(int(operand.value == 0))
+    return expr if operand is expr.operand else replace(expr, operand=operand)
+
+
+def _rebuild_binop(node: BinOp, children: Sequence[ASTNode]) -> Expr:
+    left, right = children
+    return fold_binop(node, cast(Expr, left), cast(Expr, right))
+
+
+def _rebuild_unaryop(node: UnaryOp, children: Sequence[ASTNode]) -> Expr:
+    (operand,) = children
+    return fold_unaryop(node, cast(Expr, operand))
+
+
+def _is_static(stmt: ASTNode) -> bool:
+    """Whether a statement is an if or while loop that _prune_body rewrites."""
+    if isinstance(stmt, IfStmt):
+        return isinstance(stmt.condition, Number)
+    if isinstance(stmt, WhileLoop):
+        return isinstance(stmt.condition, Number) and stmt.condition.value == 0
+    return False
+
+
+def _prune_body(body: Sequence[ASTNode]) -> list[ASTNode]:
+    """Inline if statements with a literal condition and drop `while 0` loops."""
+    pruned: list[ASTNode] = []
+    for stmt in body:
+        if not _is_static(stmt):
+            pruned.append(stmt)
+        elif isinstance(stmt, IfStmt):
+            condition = cast(Number, stmt.condition)  # Checked by _is_static
+            pruned.extend(stmt.then_body if condition.value else stmt.else_body or ())
+    return pruned
+
+
+def _rebuild_if(node: IfStmt, children: Sequence[ASTNode]) -> IfStmt:
+    then_end = 1 + len(node.then_body)
+    then_body = cast(list[Statement], _prune_body(children[1:then_end]))
+    else_body = None if node.else_body is None else _prune_body(children[then_end:])
+    return replace(
+        node,
+        condition=cast(Expr, children[0]),
+        then_body=then_body,
+        else_body=cast(list[Statement] | None, else_body),
+    )
+
+
+# Builds a node from its folded children, given in the order of ast_walker.children
+Rebuilder = Callable[[Any, Sequence[ASTNode]], ASTNode]
+
+_REBUILDERS: dict[type, Rebuilder] = {
+    BinOp: _rebuild_binop,
+    UnaryOp: _rebuild_unaryop,
+    Call: lambda node, children: replace(node, args=list(children)),
+    Assignment: lambda node, children: replace(node, value=children[0]),
+    Print: lambda node, children: replace(node, value=children[0]),
+    Println: lambda node, children: replace(node, value=children[0]),
+    ReturnStmt: lambda node, children: replace(node, expr=children[0]),
+    CallStmt: lambda node, children: replace(node, call=children[0]),
+    IfStmt: _rebuild_if,
+    WhileLoop: lambda node, children: replace(
+        node, condition=children[0], body=_prune_body(children[1:])
+    ),
+    ForLoop: lambda node, children: replace(
+        node,
+        init_value=children[0],
+        condition=children[1],
+        update_value=children[2],
+        body=_prune_body(children[3:]),
+    ),
+    SubroutineDef: lambda node, children: replace(node, body=_prune_body(children)),
+    Program: lambda node, children: replace(node, top_level=_prune_body(children)),
+}
+
+# Nodes that are rebuilt even when their children are unchanged, to fold themselves
+_FOLDABLE: Final[frozenset[type]] = frozenset((BinOp, UnaryOp))
+
+# Nodes with statement bodies, rebuilt when a body contains a statement to prune
+_HAS_BODY: Final[frozenset[type]] = frozenset((IfStmt, WhileLoop, ForLoop, SubroutineDef, Program))
+
+
+def fold_constants(node: ASTNode) -> ASTNode:
+    """Return a copy of an AST with its constant expressions folded.
+
+    The tree is traversed bottom-up with an explicit stack, so deeply nested code does
+    not hit Python's recursion limit. Unchanged subtrees are shared with the input.
+
+    Args:
+        node: The root of the tree to fold, typically a Program.
+
+    Returns:
+        The folded tree (the input node itself if nothing could be folded).
+    """
+    # Folded nodes, in post-order; a parent takes its children off the end
+    folded: list[ASTNode] = []
+    # (node, True once its children have been pushed)
+    stack: list[tuple[ASTNode, bool]] = [(node, False)]
+    while stack:
+        current, expanded = stack.pop()
+        children = children_of(current)
+        if not children:
+            folded.append(current)
+            continue
+        if not expanded:
+            stack.append((current, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        count = len(children)
+        new_children = folded[-count:]
+        del folded[-count:]
+        kind = type(current)
+        if (
+            kind in _FOLDABLE
+            or any(map(is_not, new_children, children))
+            or (kind in _HAS_BODY and any(map(_is_static, new_children)))
+        ):
+            rebuild = _REBUILDERS.get(kind)
+            if rebuild is not None:  # Unknown node types are left for the compiler to reject
+                current = rebuild(current, new_children)
+        folded.append(current)
+
+    return folded[0]
+
+
+def fold_program(program: Program) -> Program:
+    """Fold the constant expressions of a whole program (see fold_constants)."""
+    folded = fold_constants(program)
+    assert isinstance(folded, Program)  # Statements and programs keep their type
+    return folded
@@ -1,119 +1,86 @@
 """Parser for the toy language using Lark."""
 
-from collections.abc import Callable
-from functools import wraps
-from pathlib import Path
-from typing import TypeVar
+import hashlib
+import os
+import sys
+from functools import lru_cache
 
 from lark import Lark, Token, Transformer, v_args
+from lark.tree import Meta
 
 from src.ast_nodes import *
 
-# TypeVar for preserving the return type in decorators
-T = TypeVar("T", bound=ASTNode)
 
+class ASTBuilder(Transformer):
+    """Transforms Lark parse tree into our custom AST with source location tracking.
 
-def with_location(node_factory: Callable[..., T]) -> Callable[..., T]:
-    """Decorator that wraps a transformer method to automatically add location info.
-
-    The decorated method can optionally accept children list and return an AST node.
-    This decorator will:
-    1. Use v_args(meta=True) to receive meta as first param and children as second
-    2. Call the original function with children only if it accepts them
-    3. Add location info to the returned AST node using meta
-
-    Usage:
-        @with_location
-        def add(self, children: list) -> BinOp:
-            left, right = children
-            return BinOp(op=BinOpType.ADD, left=left, right=right)
-
-        @with_location
-        def break_stmt(self) -> Break:
-            return Break()
+    A builder is made for each parse, so the filename it records in locations is never
+    shared between parses.
     """
 
-    @wraps(node_factory)
-    @v_args(meta=True)
-    def wrapper(self: "ASTBuilder", meta, children: list) -> T:
-        # Check if the node_factory accepts a children parameter
-        import inspect
-
-        sig = inspect.signature(node_factory)
-        params = list(sig.parameters.keys())
-
-        # Call with children only if the function accepts it (has a second parameter after self)
-        node = node_factory(self, children) if len(params) > 1 else node_factory(self)
-
-        # Extract location from meta and add to node
-        if meta and hasattr(meta, "line"):
-            node.location = SourceLocation(
-                file=self.filename,
-                line=meta.line,
-                column=meta.column,
-                end_line=getattr(meta, "end_line", None),
-                end_column=getattr(meta, "end_column", None),
-            )
-        return node
-
-    return wrapper
-
+    def __init__(self, filename: str | None = None) -> None:
+        super().__init__()
+        self.filename = filename
 
-class ASTBuilder(Transformer):
-    """Transforms Lark parse tree into our custom AST with source location tracking."""
+    def _location(self, meta: Meta) -> SourceLocation:
+        """Source location of a rule's match, for the node built from it.
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.filename: str | None = None
+        Rules that build nodes take the match's meta (via v_args(meta=True, inline=True))
+        followed by their children, and pass this location to the node's constructor.
+        """
+        return SourceLocation(self.filename, meta.line, meta.column, meta.end_line, meta.end_column)
 
     def start(self, items: list[ASTNode]) -> Program:
         return Program(top_level=items)
 
     # Statements
-    @with_location
-    def assignment(self, children: list) -> Assignment:
-        name: str
-        value: Expr
-        name, value = children
-        return Assignment(name=name, value=value)
-
-    @with_location
-    def print_stmt(self, children: list) -> Print:
-        value: Expr | String = children[0]
-        return Print(value=value)
-
-    @with_location
-    def println_stmt(self, children: list) -> Println:
-        value: Expr | String = children[0]
-        return Println(value=value)
-
-    @with_location
-    def if_stmt(self, children: list) -> IfStmt:
-        condition: Expr = children[0]
-        then_body: list = children[1]
-        else_body: list | None = children[2] if len(children) > 2 else None
-        return IfStmt(condition=condition, then_body=then_body, else_body=else_body)
+    @v_args(meta=True, inline=True)
+    def assignment(self, meta: Meta, name: str, value: Expr) -> Assignment:
+        return Assignment(name=name, value=value, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def print_stmt(self, meta: Meta, value: Expr | String) -> Print:
+        return Print(value=value, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def println_stmt(self, meta: Meta, value: Expr | String) -> Println:
+        return Println(value=value, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def if_stmt(
+        self, meta: Meta, condition: Expr, then_body: list, else_body: list | None = None
+    ) -> IfStmt:
+        return IfStmt(
+            condition=condition,
+            then_body=then_body,
+            else_body=else_body,
+            location=self._location(meta),
+        )
 
+    # Lark passes each rule a freshly built children list, so list-valued rules
+    # return it as-is instead of copying it
     def then_block(self, items: list) -> list:
-        return list(items)
+        return items
 
     def else_block(self, items: list) -> list:
-        return list(items)
-
-    @with_location
-    def while_stmt(self, children: list) -> WhileLoop:
-        condition: Expr = children[0]
-        body: list = children[1:]
-        return WhileLoop(condition=condition, body=list(body))
-
-    @with_location
-    def for_stmt(self, children: list) -> ForLoop:
-        init_var: str = children[0]
-        init_value: Expr = children[1]
-        condition: Expr = children[2]
-        update_var: str = children[3]
-        update_value: Expr = children[4]
-        body: list = children[5:]
+        return items
+
+    # Rules with a variable number of body statements take them as *body
+    @v_args(meta=True, inline=True)
+    def while_stmt(self, meta: Meta, condition: Expr, *body: Statement) -> WhileLoop:
+        return WhileLoop(condition=condition, body=list(body), location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def for_stmt(
+        self,
+        meta: Meta,
+        init_var: str,
+        init_value: Expr,
+        condition: Expr,
+        update_var: str,
+        update_value: Expr,
+        *body: Statement,
+    ) -> ForLoop:
         return ForLoop(
             init_var=init_var,
             init_value=init_value,
@@ -121,58 +88,51 @@ class ASTBuilder(Transformer):
             update_var=update_var,
             update_value=update_value,
             body=list(body),
+            location=self._location(meta),
         )
 
-    @with_location
-    def return_stmt(self, children: list) -> ReturnStmt:
-        expr: Expr = children[0]
-        return ReturnStmt(expr=expr)
+    @v_args(meta=True, inline=True)
+    def return_stmt(self, meta: Meta, expr: Expr) -> ReturnStmt:
+        return ReturnStmt(expr=expr, location=self._location(meta))
 
-    @with_location
-    def break_stmt(self) -> Break:
-        return Break()
+    @v_args(meta=True, inline=True)
+    def break_stmt(self, meta: Meta) -> Break:
+        return Break(location=self._location(meta))
 
-    @with_location
-    def continue_stmt(self) -> Continue:
-        return Continue()
+    @v_args(meta=True, inline=True)
+    def continue_stmt(self, meta: Meta) -> Continue:
+        return Continue(location=self._location(meta))
 
-    @with_location
-    def call_stmt(self, children: list) -> CallStmt:
-        name: str
-        args: list
-        name, args = children
+    @v_args(meta=True, inline=True)
+    def call_stmt(self, meta: Meta, name: str, args: list) -> CallStmt:
         # Wrap the Call expression in a CallStmt statement
         # Note: We need to create the Call node separately to also give it location
         call = Call(name=name, args=args)
         call.location = None  # Call gets location from parent CallStmt for now
-        return CallStmt(call=call)
+        return CallStmt(call=call, location=self._location(meta))
 
-    @with_location
-    def subroutine_def(self, children: list) -> SubroutineDef:
-        name: str
-        params: list
-        body: list
-        name, params, body = children
-        return SubroutineDef(name=name, params=params, body=body)
+    @v_args(meta=True, inline=True)
+    def subroutine_def(self, meta: Meta, name: str, params: list, body: list) -> SubroutineDef:
+        return SubroutineDef(name=name, params=params, body=body, location=self._location(meta))
 
     def param_list(self, items: list[str]) -> list[str]:
         return items
 
     def sub_body(self, items: list) -> list:
-        return list(items)
+        return items
 
     def arg_list(self, items: list) -> list:
-        return list(items)
+        return items
 
     # Expressions
-    @with_location
-    def number(self, children: list) -> Number:
-        value: int = children[0]
-        return Number(value=value)
+    @v_args(meta=True, inline=True)
+    def number(self, meta: Meta, value: int) -> Number:
+        return Number(value=value, location=self._location(meta))
 
     def NAME(self, token: Token) -> str:  # noqa: N802
-        # Transform NAME tokens into strings automatically
-        return str(token)
+        # Transform NAME tokens into strings automatically, interned so that every use
+        # of an identifier shares one string object (cheap set and dict lookups later)
+        return sys.intern(str(token))
 
     def NUMBER(self, token: Token) -> int:  # noqa: N802
         # Transform NUMBER tokens into integers automatically
@@ -189,129 +149,124 @@ class ASTBuilder(Transformer):
             end_line=token.end_line,
             end_column=token.end_column,
         )
-        return String(value=str(token).strip('"'), location=loc)
+        # The grammar's STRING tokens are always one pair of quotes around the text
+        return String(value=token[1:-1], location=loc)
 
-    @with_location
-    def var(self, children: list) -> Var:
-        name: str = children[0]
-        return Var(name=name)
+    @v_args(meta=True, inline=True)
+    def var(self, meta: Meta, name: str) -> Var:
+        return Var(name=name, location=self._location(meta))
 
-    @with_location
-    def call(self, children: list) -> Call:
-        name: str
-        args: list
-        name, args = children
-        return Call(name=name, args=args)
+    @v_args(meta=True, inline=True)
+    def call(self, meta: Meta, name: str, args: list) -> Call:
+        return Call(name=name, args=args, location=self._location(meta))
 
     # Binary operations - Arithmetic
-    @with_location
-    def add(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.ADD, left=left, right=right)
-
-    @with_location
-    def sub(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.SUB, left=left, right=right)
-
-    @with_location
-    def mul(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.MUL, left=left, right=right)
-
-    @with_location
-    def div(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.DIV, left=left, right=right)
+    @v_args(meta=True, inline=True)
+    def add(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.ADD, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def sub(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.SUB, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def mul(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.MUL, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def div(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.DIV, left=left, right=right, location=self._location(meta))
 
     # Binary operations - Comparisons
-    @with_location
-    def eq(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.EQ, left=left, right=right)
-
-    @with_location
-    def ne(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.NE, left=left, right=right)
-
-    @with_location
-    def lt(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.LT, left=left, right=right)
-
-    @with_location
-    def le(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.LE, left=left, right=right)
-
-    @with_location
-    def gt(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.GT, left=left, right=right)
-
-    @with_location
-    def ge(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.GE, left=left, right=right)
+    @v_args(meta=True, inline=True)
+    def eq(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.EQ, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def ne(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.NE, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def lt(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.LT, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def le(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.LE, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def gt(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.GT, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def ge(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.GE, left=left, right=right, location=self._location(meta))
 
     # Binary operations - Logical (short-circuit)
-    @with_location
-    def and_op(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.AND, left=left, right=right)
-
-    @with_location
-    def or_op(self, children: list) -> BinOp:
-        left: Expr
-        right: Expr
-        left, right = children
-        return BinOp(op=BinOpType.OR, left=left, right=right)
+    @v_args(meta=True, inline=True)
+    def and_op(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.AND, left=left, right=right, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def or_op(self, meta: Meta, left: Expr, right: Expr) -> BinOp:
+        return BinOp(op=BinOpType.OR, left=left, right=right, location=self._location(meta))
 
     # Unary operations
-    @with_location
-    def negate(self, children: list) -> UnaryOp:
-        operand: Expr = children[0]
-        return UnaryOp(op=UnaryOpType.NEGATE, operand=operand)
+    @v_args(meta=True, inline=True)
+    def negate(self, meta: Meta, operand: Expr) -> UnaryOp:
+        return UnaryOp(op=UnaryOpType.NEGATE, operand=operand, location=self._location(meta))
+
+    @v_args(meta=True, inline=True)
+    def not_op(self, meta: Meta, operand: Expr) -> UnaryOp:
+        return UnaryOp(op=UnaryOpType.NOT, operand=operand, location=self._location(meta))
+
 
-    @with_location
-    def not_op(self, children: list) -> UnaryOp:
-        operand: Expr = children[0]
-        return UnaryOp(op=UnaryOpType.NOT, operand=operand)
+def _lark_cache_file(grammar: str) -> str | bool:
+    """Path of the file Lark caches a grammar's parse tables in, or False to not cache.
+
+    The file lives in a directory only the current user can write to
+    ($XDG_CACHE_HOME/toy-compiler, by default ~/.cache/toy-compiler), since Lark
+    unpickles whatever it finds there. It is named after a hash of the grammar text;
+    Lark also checks a hash of the grammar, its options and version stored in the file
+    before loading it.
+    Caching is skipped if the directory cannot be created.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache_dir = os.path.join(cache_home, "toy-compiler")
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    except OSError:
+        return False
+    digest = hashlib.sha256(grammar.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"grammar-{digest}.lark-cache")
+
+
+@lru_cache(maxsize=8)
+def _get_lark(grammar_path: str, mtime: float) -> Lark:
+    """Build the LALR parser for a grammar file.
+
+    Building the parse tables is far more expensive than parsing a typical program, so
+    parsers are shared by every Parser instance using the same grammar. The file's
+    modification time is part of the cache key, so an edited grammar is rebuilt.
+
+    Across processes, Lark's own cache pickles the built tables to a file in the user's
+    cache directory (see _lark_cache_file), so each CLI run after the first loads them
+    instead.
+    """
+    with open(grammar_path) as f:
+        grammar = f.read()
+    return Lark(grammar, parser="lalr", propagate_positions=True, cache=_lark_cache_file(grammar))
 
 
 class Parser:
-    """Main parser class."""
+    """Main parser class.
 
-    def __init__(self, grammar_path: str = "src/grammar.lark"):
-        grammar_file = Path(grammar_path)
-        with open(grammar_file) as f:
-            grammar = f.read()
+    A Parser holds no per-parse state, so one instance can be shared by any number of
+    callers, including threads (see get_parser).
+    """
 
-        self.parser = Lark(grammar, parser="lalr", propagate_positions=True)
-        self.transformer = ASTBuilder()
+    def __init__(self, grammar_path: str = "src/grammar.lark"):
+        self.parser = _get_lark(grammar_path, os.path.getmtime(grammar_path))
 
     def parse(self, code: str, filename: str | None = None) -> Program:
         """Parse source code and return AST with location information.
@@ -323,8 +278,21 @@ class Parser:
         Returns:
             Program AST with location info populated in all nodes
         """
-        self.transformer.filename = filename
         parse_tree = self.parser.parse(code)
-        result = self.transformer.transform(parse_tree)
+        result = ASTBuilder(filename).transform(parse_tree)
         assert isinstance(result, Program)
         return result
+
+
+@lru_cache(maxsize=8)
+def _shared_parser(grammar_path: str, mtime: float) -> Parser:
+    """Parser for a grammar file, keyed like _get_lark so an edited grammar gets a new one."""
+    return Parser(grammar_path)
+
+
+def get_parser(grammar_path: str = "src/grammar.lark") -> Parser:
+    """Return the process-wide Parser for a grammar file, creating it on first use.
+
+    A new Parser is created when the grammar file has been modified since.
+    """
+    return _shared_parser(grammar_path, os.path.getmtime(grammar_path))
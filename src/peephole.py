@@ -0,0 +1,178 @@
+"""Peephole optimization of generated assembly.
+
+The compiler's code generation often produces short instruction sequences that a
+simpler sequence can replace, for example a jump to the label that immediately
+follows it, or a branch to a label whose first instruction is another jump:
+
+    jmp update.0
+update.0:
+
+This pass runs over the emitted text of a section. Each line is parsed once into a
+small instruction record (see Line), the rewrite rules work on those records, and
+only lines that were changed are rendered back to text. Comments and blank lines are
+kept in place and never prevent a rewrite.
+
+Jumps are only ever made to labels in the same section, so the jump rules need no
+knowledge of the rest of the program.
+"""
+
+from typing import NamedTuple
+
+# Conditional jumps and the jump taken on the opposite condition
+INVERSE_JUMPS = {
+    "je": "jne",
+    "jne": "je",
+    "jl": "jge",
+    "jge": "jl",
+    "jle": "jg",
+    "jg": "jle",
+}
+
+
+class Line(NamedTuple):
+    """One parsed line of assembly.
+
+    Attributes:
+        text: The line as emitted, including indentation and comment.
+        opcode: The instruction mnemonic, ":" for a label, or "" for a line that is
+            blank or only a comment.
+        operand: The instruction's operand text, or the label name for a label.
+    """
+
+    text: str
+    opcode: str
+    operand: str
+
+
+def parse_line(text: str) -> Line:
+    """Parse a line of assembly into its opcode and operand text."""
+    instruction = text.partition(";")[0].strip()
+    if not instruction:  # Blank or comment-only line
+        return Line(text, "", "")
+    if instruction.endswith(":"):
+        return Line(text, ":", instruction[:-1])
+    opcode, _, operand = instruction.partition(" ")
+    return Line(text, opcode, operand.strip())
+
+
+def rewrite(line: Line, opcode: str, operand: str, keep_comment: bool = True) -> Line:
+    """Replace a line's instruction, keeping its indentation and (optionally) comment."""
+    text = line.text
+    indent = text[: len(text) - len(text.lstrip())]
+    comment = text.partition(";")[2] if keep_comment else ""
+    instruction = f"{indent}{opcode} {operand}"
+    return Line(f"{instruction}    ;{comment}" if comment else instruction, opcode, operand)
+
+
+def optimize(code: str) -> str:
+    """Apply the peephole rewrites to a section's assembly text.
+
+    Args:
+        code: Newline-separated assembly lines.
+
+    Returns:
+        The rewritten assembly text.
+    """
+    return "\n".join(optimize_lines(code.split("\n")))
+
+
+def optimize_lines(lines: list[str]) -> list[str]:
+    """Apply all rewrite rules to a list of assembly lines.
+
+    Args:
+        lines: Assembly lines without trailing newlines.
+
+    Returns:
+        The rewritten lines.
+    """
+    parsed = thread_jumps(list(map(parse_line, lines)))
+    parsed = remove_jumps_to_next(parsed)
+    return [line.text for line in parsed]
+
+
+def thread_jumps(lines: list[Line]) -> list[Line]:
+    """Retarget jumps to labels whose first instruction is an unconditional jump.
+
+    A jump to L where L is followed by `jmp M` goes straight to M instead (following
+    chains of such labels). Conditional jumps are threaded the same way.
+    """
+    # Label -> target of the unconditional jump that is the label's first instruction
+    forwards: dict[str, str] = {}
+    labels: list[str] = []
+    for line in lines:
+        if line.opcode == ":":
+            labels.append(line.operand)
+        elif line.opcode:
+            if line.opcode == "jmp":
+                forwards.update(dict.fromkeys(labels, line.operand))
+            labels.clear()
+    if not forwards:
+        return lines
+
+    out = []
+    for line in lines:
+        opcode = line.opcode
+        if opcode == "jmp" or opcode in INVERSE_JUMPS:
+            target = line.operand
+            seen = {target}
+            while target in forwards and forwards[target] not in seen:
+                target = forwards[target]
+                seen.add(target)
+            if target != line.operand:
+                line = rewrite(line, opcode, target)
+        out.append(line)
+    return out
+
+
+def remove_jumps_to_next(lines: list[Line]) -> list[Line]:
+    """Remove jumps that only skip over other jumps to the code that follows them.
+
+    Rules, where A and B are labels:
+    - jmp A / A:          ->  A:
+    - jcc A / jmp B / A:  ->  jncc B / A:
+    """
+    removed: set[int] = set()  # Indexes of unconditional jumps folded into a branch
+    out: list[Line] = []
+    for index, line in enumerate(lines):
+        if index in removed:
+            continue
+        opcode = line.opcode
+        if opcode == "jmp" or opcode in INVERSE_JUMPS:
+            if line.operand in _labels_after(lines, index + 1):
+                continue  # Falls through to the target anyway
+
+            inverse = INVERSE_JUMPS.get(opcode)
+            jump_index = _next_instruction(lines, index + 1) if inverse else None
+            if (
+                inverse is not None
+                and jump_index is not None
+                and lines[jump_index].opcode == "jmp"
+                and line.operand in _labels_after(lines, jump_index + 1)
+            ):
+                # Branch straight to the unconditional jump's target instead (the
+                # original comment describes the old condition, so it is dropped)
+                out.append(rewrite(line, inverse, lines[jump_index].operand, False))
+                removed.add(jump_index)
+                continue
+        out.append(line)
+    return out
+
+
+def _next_instruction(lines: list[Line], start: int) -> int | None:
+    """Index of the first instruction or label at or after start, if any."""
+    for index in range(start, len(lines)):
+        if lines[index].opcode:
+            return index
+    return None
+
+
+def _labels_after(lines: list[Line], start: int) -> set[str]:
+    """Labels reached from start by falling through, before the next instruction."""
+    labels = set()
+    for index in range(start, len(lines)):
+        line = lines[index]
+        if line.opcode == ":":
+            labels.add(line.operand)
+        elif line.opcode:
+            break
+    return labels
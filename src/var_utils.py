@@ -10,10 +10,23 @@ The variable collection is scope-aware:
 
 These utilities are essential for the compiler's stack frame setup, as they determine
 how much stack space to allocate and which offsets to assign to each variable.
+build_program_frame and build_subroutine_frame do both in a single walk, assigning
+stack slots in order of first appearance.
+
+Frames are built fresh on every call, since the nodes are mutable; the compiler keeps
+the frames it builds for the duration of a single compile (see Compiler.reset).
 """
 
+from typing import Final, cast
+
 from src.ast_nodes import *
-from src.ast_walker import walk
+from src.ast_walker import walk_of
+
+# Constants for stack layout
+BYTES_PER_QWORD: Final[int] = 8  # Each 64-bit value occupies 8 bytes on the stack
+PARAM_OFFSET_START: Final[int] = 2  # Parameter indexing starts at 2 qwords (16 bytes) above rbp
+# This skips: saved rbp (at rbp+0) and return address (at rbp+8)
+REGISTER_PARAM_COUNT: Final[int] = 6  # Parameters passed in registers (System V AMD64 ABI)
 
 
 def collect_program_variables(program: Program) -> set[str]:
@@ -45,23 +58,11 @@ def collect_program_variables(program: Program) -> set[str]:
     Note:
         - Variables are collected from both assignments and references to ensure
           all used variables are allocated (even if only read, not written)
-        - Subroutines are skipped (via walk's skip parameter) since they have
-          their own stack frames
+        - Subroutines are skipped since they have their own stack frames
         - Duplicate variable names naturally collapse into the set
     """
-    variables = set()
-
-    # Walk the AST, skipping subroutine definitions (they have separate scopes)
-    for node in walk(program, skip=[SubroutineDef]):
-        match node:
-            case Assignment(name=name):
-                # Variable being assigned to (e.g., "x" in "x = 5;")
-                variables.add(name)
-            case Var(name=name):
-                # Variable being referenced (e.g., "x" in "y = x + 1;")
-                variables.add(name)
-
-    return variables
+    # The frame has a slot for exactly these variables
+    return set(build_program_frame(program))
 
 
 def collect_subroutine_local_variables(subroutine: SubroutineDef) -> set[str]:
@@ -70,11 +71,10 @@ def collect_subroutine_local_variables(subroutine: SubroutineDef) -> set[str]:
     This function walks a subroutine's body and collects all variable names,
     then filters out parameters to get only the local variables. Local variables
     are those that need stack allocation within the subroutine's frame, while
-    parameters are passed on the stack by the caller.
+    parameters are passed in by the caller.
 
-    The distinction is important for stack frame layout:
-    - Parameters have positive rbp offsets (above the frame pointer)
-    - Local variables have negative rbp offsets (below the frame pointer)
+    The distinction is important for stack frame layout: parameters are given their
+    slots first (see build_subroutine_frame), followed by the local variables.
 
     Args:
         subroutine: The SubroutineDef AST node to analyze.
@@ -95,29 +95,76 @@ def collect_subroutine_local_variables(subroutine: SubroutineDef) -> set[str]:
         Parameters "x" and "y" are excluded since they're passed by the caller.
 
     Note:
-        - This function walks the entire subroutine body (no skip parameter)
-          since we want all variables within this scope
+        - The entire subroutine body is walked since we want all variables within
+          this scope
         - Both assignments and references are collected to ensure all variables
           used in the subroutine are accounted for
         - Parameters are identified from the subroutine's parameter list and
           removed from the result set
     """
-    # Get parameter names as a set for efficient lookup
-    params = set(subroutine.params)
-
-    # Collect all variables used in the subroutine body
-    all = set()
-    for node in walk(subroutine):
-        match node:
-            case Assignment(name=name):
-                # Variable being assigned to (could be parameter or local)
-                all.add(name)
-            case Var(name=name):
-                # Variable being referenced (could be parameter or local)
-                all.add(name)
-
-    # Compute local variables by removing parameters from all variables
-    # This gives us only the variables that need allocation in this frame
-    body = all - params
-
-    return body
+    # The frame gives exactly the non-parameter variables a local slot
+    return set(build_subroutine_frame(subroutine)[1])
+
+
+def build_program_frame(program: Program) -> dict[str, int]:
+    """Assign a stack slot to every variable of the main program scope.
+
+    Collects the same variables as collect_program_variables, but assigns each one its
+    rbp offset as soon as it is first seen, so the frame is built in a single walk.
+
+    Args:
+        program: The Program AST node representing the entire program.
+
+    Returns:
+        A mapping from variable name to its rbp offset (rbp-8, rbp-16, ...), in order
+        of first appearance in the source.
+    """
+    offsets: dict[str, int] = {}
+
+    # Subroutines can only be defined at the top level, so skipping them there means
+    # the statements can be walked without checking every node for a subroutine
+    for item in program.top_level:
+        if type(item) is SubroutineDef:
+            continue
+        for node in walk_of(item, Assignment, Var):
+            name = cast(Assignment | Var, node).name
+            if name not in offsets:
+                offsets[name] = -(len(offsets) + 1) * BYTES_PER_QWORD
+
+    return offsets
+
+
+def build_subroutine_frame(subroutine: SubroutineDef) -> tuple[dict[str, int], dict[str, int]]:
+    """Assign rbp offsets to a subroutine's parameters and local variables.
+
+    The first REGISTER_PARAM_COUNT parameters arrive in registers and are stored by the
+    prologue in the first slots below the frame pointer (rbp-8, rbp-16, ...), in
+    declaration order. Any further parameters are passed on the stack and sit above it
+    (rbp+16, rbp+24, ...). Locals are collected as in collect_subroutine_local_variables
+    and given the slots after the register parameters, in order of first appearance,
+    in the same walk.
+
+    Args:
+        subroutine: The SubroutineDef AST node to analyze.
+
+    Returns:
+        A (parameter offsets, local variable offsets) pair of name-to-offset mappings.
+    """
+    params = subroutine.params
+    param_offsets = {
+        param: -(idx + 1) * BYTES_PER_QWORD
+        for idx, param in enumerate(params[:REGISTER_PARAM_COUNT])
+    }
+    param_offsets.update(
+        (param, (idx + PARAM_OFFSET_START) * BYTES_PER_QWORD)
+        for idx, param in enumerate(params[REGISTER_PARAM_COUNT:])
+    )
+    slot_count = min(len(params), REGISTER_PARAM_COUNT)  # Slots taken by register params
+    local_offsets: dict[str, int] = {}
+
+    for node in walk_of(subroutine, Assignment, Var):
+        name = cast(Assignment | Var, node).name
+        if name not in param_offsets and name not in local_offsets:
+            local_offsets[name] = -(slot_count + len(local_offsets) + 1) * BYTES_PER_QWORD
+
+    return param_offsets, local_offsets
@@ -10,43 +10,43 @@ class TestSectionWriter:
         """Test initialization with section name."""
         writer = SectionWriter("data")
         assert writer.section_name == "data"
-        assert writer.code == []
+        assert writer.get_output() == ""
 
     def test_init_without_section_name(self):
         """Test initialization without section name."""
         writer = SectionWriter()
         assert writer.section_name is None
-        assert writer.code == []
+        assert writer.get_output() == ""
 
     def test_emit_single_line(self):
         """Test emitting a single line of code."""
         writer = SectionWriter()
         writer.emit("mov rax, 0")
-        assert writer.code == ["\tmov rax, 0"]
+        assert writer.get_output() == "\tmov rax, 0"
 
     def test_emit_multiple_lines(self):
         """Test emitting multiple lines of code."""
         writer = SectionWriter()
         writer.emit("mov rax, 0\nmov rbx, 1")
-        assert writer.code == ["\tmov rax, 0", "\tmov rbx, 1"]
+        assert writer.get_output() == "\tmov rax, 0\n\tmov rbx, 1"
 
     def test_emit_with_custom_indent(self):
         """Test emitting with custom indentation level."""
         writer = SectionWriter()
         writer.emit("instruction", indent_level=2)
-        assert writer.code == ["\t\tinstruction"]
+        assert writer.get_output() == "\t\tinstruction"
 
     def test_emit_with_leading_whitespace(self):
         """Test that leading whitespace is stripped."""
         writer = SectionWriter()
         writer.emit("   mov rax, 0")
-        assert writer.code == ["\tmov rax, 0"]
+        assert writer.get_output() == "\tmov rax, 0"
 
     def test_emit_empty_lines(self):
         """Test that empty lines are preserved."""
         writer = SectionWriter()
         writer.emit("mov rax, 0\n\nmov rbx, 1")
-        assert writer.code == ["\tmov rax, 0", "", "\tmov rbx, 1"]
+        assert writer.get_output() == "\tmov rax, 0\n\n\tmov rbx, 1"
 
     def test_emit_with_dedent(self):
         """Test that dedent works correctly."""
@@ -55,19 +55,56 @@ class TestSectionWriter:
             mov rax, 0
             mov rbx, 1
         """)
-        assert writer.code == ["\tmov rax, 0", "\tmov rbx, 1"]
+        assert writer.get_output() == "\tmov rax, 0\n\tmov rbx, 1"
+
+    def test_emit_line(self):
+        """Test emitting pre-normalized single lines."""
+        writer = SectionWriter()
+        writer.emit_line("mov rax, 0")
+        writer.emit_line("")
+        writer.emit_line("ret", indent_level=2)
+        assert writer.get_output() == "\tmov rax, 0\n\n\t\tret"
+
+    def test_emit_line_matches_emit(self):
+        """Test that emit_line produces the same text as emit for a single line."""
+        line_writer, emit_writer = SectionWriter(), SectionWriter()
+        line_writer.emit_line("push qword 42")
+        emit_writer.emit("push qword 42")
+        assert line_writer.get_output() == emit_writer.get_output()
+
+    def test_emit_lines(self):
+        """Test emitting a sequence of pre-normalized lines."""
+        writer = SectionWriter()
+        writer.emit_lines(["pop rax", "", "ret"])
+        assert writer.get_output() == "\tpop rax\n\n\tret"
+
+    def test_blank_line_collapses(self):
+        """Test that consecutive blank line requests produce a single blank line."""
+        writer = SectionWriter()
+        writer.emit_line("pop rax")
+        writer.blank_line()
+        writer.blank_line()
+        writer.emit_raw("done:")
+        assert writer.get_output() == "\tpop rax\n\ndone:"
+
+    def test_trailing_blank_line_dropped(self):
+        """Test that a blank line request with no code after it is not written."""
+        writer = SectionWriter()
+        writer.emit_line("ret")
+        writer.blank_line()
+        assert writer.get_output() == "\tret"
 
     def test_emit_raw_single_line(self):
         """Test emitting raw code without indentation."""
         writer = SectionWriter()
         writer.emit_raw("label:")
-        assert writer.code == ["label:"]
+        assert writer.get_output() == "label:"
 
     def test_emit_raw_with_whitespace(self):
         """Test that raw emit strips leading/trailing whitespace."""
         writer = SectionWriter()
         writer.emit_raw("   label:   ")
-        assert writer.code == ["label:"]
+        assert writer.get_output() == "label:"
 
     def test_emit_raw_multiline(self):
         """Test emitting raw multiline code."""
@@ -77,7 +114,7 @@ class TestSectionWriter:
             global _start
         """)
         expected = "section .text\nglobal _start"
-        assert writer.code == [expected]
+        assert writer.get_output() == expected
 
     def test_get_output_empty(self):
         """Test get_output with no code."""
@@ -99,6 +136,15 @@ class TestSectionWriter:
         expected = "section .data\n\tdb 'hello'"
         assert writer.get_output() == expected
 
+    def test_get_output_repeated(self):
+        """Test that repeated reads are stable and reflect later emits."""
+        writer = SectionWriter("text")
+        writer.emit("mov rax, 0")
+        first = writer.get_output()
+        assert writer.get_output() is first
+        writer.emit_raw("done:")
+        assert writer.get_output() == "section .text\n\tmov rax, 0\ndone:"
+
     def test_mixed_emit_and_emit_raw(self):
         """Test mixing emit and emit_raw calls."""
         writer = SectionWriter()
@@ -123,29 +169,29 @@ class TestSectionWriter:
 
     def test_empty_string_emit(self):
         """Test emitting empty string."""
-        writer = SectionWriter()
+        writer = SectionWriter("text")
         writer.emit("")
         # Empty string results in empty line
-        assert writer.code == [""]
+        assert writer.get_output() == "section .text\n"
 
     def test_whitespace_only_emit(self):
         """Test emitting whitespace-only string."""
-        writer = SectionWriter()
+        writer = SectionWriter("text")
         writer.emit("   \n   ")
         # Whitespace-only results in single empty line (dedent strips the whitespace)
-        assert writer.code == [""]
+        assert writer.get_output() == "section .text\n"
 
     def test_zero_indent_level(self):
         """Test emitting with zero indentation."""
         writer = SectionWriter()
         writer.emit("instruction", indent_level=0)
-        assert writer.code == ["instruction"]
+        assert writer.get_output() == "instruction"
 
     def test_assembly_comment(self):
         """Test emitting assembly comments."""
         writer = SectionWriter()
         writer.emit("; This is a comment")
-        assert writer.code == ["\t; This is a comment"]
+        assert writer.get_output() == "\t; This is a comment"
 
     def test_complex_assembly_block(self):
         """Test emitting a complex assembly block."""
@@ -40,6 +40,30 @@ class TestASTNodeLocation:
         assert node.location is None
         assert node.location_str() == "unknown location"
 
+    def test_location_can_be_set_after_construction(self):
+        """Test that slotted nodes still accept a location assigned by the parser."""
+        node = Number(value=42)
+        node.location = SourceLocation(line=1, column=1)
+        assert node.location_str() == "line 1, column 1"
+        assert not hasattr(node, "__dict__")
+
+
+class TestNodeIdentity:
+    """Tests for identity-based equality and hashing of AST nodes."""
+
+    def test_structurally_equal_nodes_are_distinct(self):
+        """Test that nodes compare by identity, not by field values."""
+        first = Number(value=1)
+        assert first == first
+        assert first != Number(value=1)
+
+    def test_nodes_are_hashable(self):
+        """Test that nodes can be used as dictionary keys."""
+        left, right = Var(name="x"), Var(name="x")
+        offsets = {left: -8, right: -16}
+        assert offsets[left] == -8
+        assert offsets[right] == -16
+
 
 class TestStatements:
     """Tests for statement node creation."""
@@ -142,6 +166,13 @@ class TestExpressions:
         node = Number(value=42)
         assert node.value == 42
 
+    def test_number_of_shares_small_literals(self):
+        """Test that Number.of reuses instances for small values only."""
+        assert Number.of(0) is Number.of(0)
+        assert Number.of(1).value == 1
+        assert Number.of(100000) is not Number.of(100000)
+        assert Number.of(100000).value == 100000
+
     def test_string(self):
         """Test string literal node."""
         node = String(value="hello")
@@ -157,7 +188,7 @@ class TestExpressions:
         left = Number(value=1)
         right = Number(value=2)
         node = BinOp(op=BinOpType.ADD, left=left, right=right)
-        assert node.op == BinOpType.ADD
+        assert node.op is BinOpType.ADD
         assert node.left == left
         assert node.right == right
 
@@ -165,7 +196,7 @@ class TestExpressions:
         """Test unary operation node."""
         operand = Number(value=5)
         node = UnaryOp(op=UnaryOpType.NEGATE, operand=operand)
-        assert node.op == UnaryOpType.NEGATE
+        assert node.op is UnaryOpType.NEGATE
         assert node.operand == operand
 
     def test_call(self):
@@ -180,34 +211,39 @@ class TestBinOpType:
     """Tests for binary operator types."""
 
     def test_arithmetic_operators(self):
-        """Test arithmetic operator values."""
-        assert BinOpType.ADD.value == "+"
-        assert BinOpType.SUB.value == "-"
-        assert BinOpType.MUL.value == "*"
-        assert BinOpType.DIV.value == "/"
+        """Test arithmetic operator symbols."""
+        assert BinOpType.ADD.symbol == "+"
+        assert BinOpType.SUB.symbol == "-"
+        assert BinOpType.MUL.symbol == "*"
+        assert BinOpType.DIV.symbol == "/"
 
     def test_comparison_operators(self):
-        """Test comparison operator values."""
-        assert BinOpType.EQ.value == "=="
-        assert BinOpType.NE.value == "!="
-        assert BinOpType.LT.value == "<"
-        assert BinOpType.LE.value == "<="
-        assert BinOpType.GT.value == ">"
-        assert BinOpType.GE.value == ">="
+        """Test comparison operator symbols."""
+        assert BinOpType.EQ.symbol == "=="
+        assert BinOpType.NE.symbol == "!="
+        assert BinOpType.LT.symbol == "<"
+        assert BinOpType.LE.symbol == "<="
+        assert BinOpType.GT.symbol == ">"
+        assert BinOpType.GE.symbol == ">="
 
     def test_logical_operators(self):
-        """Test logical operator values."""
-        assert BinOpType.AND.value == "&&"
-        assert BinOpType.OR.value == "||"
+        """Test logical operator symbols."""
+        assert BinOpType.AND.symbol == "&&"
+        assert BinOpType.OR.symbol == "||"
+
+    def test_values_are_table_indices(self):
+        """Test that operator values are consecutive so they can index lookup tables."""
+        assert [op.value for op in BinOpType] == list(range(len(BinOpType)))
+        assert [op.value for op in UnaryOpType] == list(range(len(UnaryOpType)))
 
 
 class TestUnaryOpType:
     """Tests for unary operator types."""
 
-    def test_operator_values(self):
-        """Test unary operator values."""
-        assert UnaryOpType.NEGATE.value == "-"
-        assert UnaryOpType.NOT.value == "!"
+    def test_operator_symbols(self):
+        """Test unary operator symbols."""
+        assert UnaryOpType.NEGATE.symbol == "-"
+        assert UnaryOpType.NOT.symbol == "!"
 
 
 class TestSubroutineDef:
@@ -1,7 +1,9 @@
 """Tests for the AST walker module."""
 
+from dataclasses import replace
+
 from src.ast_nodes import *
-from src.ast_walker import walk
+from src.ast_walker import find_first, walk, walk_of
 
 
 class TestBasicWalking:
@@ -52,10 +54,22 @@ class TestBasicWalking:
         assert isinstance(nodes[1], Number)
         assert isinstance(nodes[2], Number)
 
+    def test_walk_replaced_node(self):
+        """Test that a node rebuilt with dataclasses.replace walks its new children."""
+        node = BinOp(op=BinOpType.ADD, left=Number(value=1), right=Number(value=2))
+        rebuilt = replace(node, right=Var(name="x"))
+        assert [type(n) for n in walk(rebuilt)] == [BinOp, Number, Var]
+
 
 class TestStatementWalking:
     """Tests for walking statement nodes."""
 
+    def test_walk_sees_appended_statement(self):
+        """Test that a statement appended to a body after construction is walked."""
+        loop = WhileLoop(condition=Var(name="x"), body=[])
+        loop.body.append(Assignment(name="z", value=Number(value=5)))
+        assert [type(n) for n in walk(loop)] == [WhileLoop, Var, Assignment, Number]
+
     def test_walk_print(self):
         """Test walking print statement."""
         node = Print(value=Var(name="x"))
@@ -264,9 +278,9 @@ class TestNestedStructures:
         # Outer BinOp, Number(1), Inner BinOp, Number(2), Number(3)
         assert len(nodes) == 5
         assert isinstance(nodes[0], BinOp)
-        assert nodes[0].op == BinOpType.ADD
+        assert nodes[0].op is BinOpType.ADD
         assert isinstance(nodes[2], BinOp)
-        assert nodes[2].op == BinOpType.MUL
+        assert nodes[2].op is BinOpType.MUL
 
     def test_walk_nested_if_statements(self):
         """Test walking nested if statements."""
@@ -316,6 +330,17 @@ class TestSkipParameter:
         assert isinstance(nodes[1], Assignment)
         assert isinstance(nodes[2], Print)
 
+    def test_skip_any_iterable(self):
+        """Test that skip accepts a frozenset or any other iterable of types."""
+        node = Assignment(name="x", value=Number(value=42))
+        assert list(walk(node, skip=frozenset([Number]))) == [node]
+        assert list(walk(node, skip=(t for t in [Number]))) == [node]
+
+    def test_skip_matches_exact_type(self):
+        """Test that skipping a base class does not skip its subclasses."""
+        node = Assignment(name="x", value=Number(value=42))
+        assert len(list(walk(node, skip=[Expr]))) == 2
+
     def test_skip_subroutine_def(self):
         """Test skipping subroutine definitions."""
         prog = Program(
@@ -402,3 +427,69 @@ class TestNodeCounting:
 
         assert len(numbers) == 3
         assert [n.value for n in numbers] == [1, 2, 3]
+
+
+class TestWalkOf:
+    """Tests for the type-filtered walker."""
+
+    def test_yields_only_requested_types_in_order(self):
+        """Test that walk_of yields matching nodes in the same order as walk."""
+        prog = Program(
+            top_level=[
+                Assignment(name="x", value=Number(value=1)),
+                Println(value=BinOp(op=BinOpType.ADD, left=Var(name="x"), right=Var(name="y"))),
+            ]
+        )
+        expected = [n for n in walk(prog) if isinstance(n, (Assignment, Var))]
+        assert list(walk_of(prog, Assignment, Var)) == expected
+        assert [type(n) for n in expected] == [Assignment, Var, Var]
+
+    def test_matches_subclasses(self):
+        """Test that walk_of filters with isinstance semantics."""
+        node = Assignment(name="x", value=UnaryOp(op=UnaryOpType.NEGATE, operand=Number(value=1)))
+        assert [type(n) for n in walk_of(node, Expr)] == [UnaryOp, Number]
+
+    def test_skip_parameter(self):
+        """Test that skipped node types are not explored."""
+        prog = Program(
+            top_level=[
+                SubroutineDef(name="f", params=[], body=[Println(value=Var(name="a"))]),
+                Println(value=Var(name="b")),
+            ]
+        )
+        (var,) = walk_of(prog, Var, skip=[SubroutineDef])
+        assert isinstance(var, Var) and var.name == "b"
+
+
+class TestFindFirst:
+    """Tests for the early-terminating search."""
+
+    def test_returns_first_match_in_walk_order(self):
+        """Test that the first matching node in pre-order is returned."""
+        first, second = Var(name="a"), Var(name="b")
+        node = Println(value=BinOp(op=BinOpType.ADD, left=first, right=second))
+        assert find_first(node, lambda n: type(n) is Var) is first
+
+    def test_no_match(self):
+        """Test that None is returned when nothing matches."""
+        node = Assignment(name="x", value=Number(value=1))
+        assert find_first(node, lambda n: type(n) is Call) is None
+
+    def test_stops_at_first_match(self):
+        """Test that nodes after the match are not visited."""
+        visited = []
+
+        def is_number(n: ASTNode) -> bool:
+            visited.append(n)
+            return type(n) is Number
+
+        node = Println(value=BinOp(op=BinOpType.ADD, left=Number(value=1), right=Var(name="y")))
+        find_first(node, is_number)
+        assert [type(n) for n in visited] == [Println, BinOp, Number]
+
+    def test_skip_parameter(self):
+        """Test that skipped node types are not searched."""
+        prog = Program(
+            top_level=[SubroutineDef(name="f", params=[], body=[Println(value=Var(name="a"))])]
+        )
+        assert find_first(prog, lambda n: type(n) is Var, skip=[SubroutineDef]) is None
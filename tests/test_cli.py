@@ -1,12 +1,74 @@
 """Tests for the CLI module."""
 
-import argparse
 import sys
 from pathlib import Path
 
 import pytest
 
-from src.cli import compile_file, main
+from src.cli import build_arg_parser, compile_batch, compile_file, main
+
+# Programs whose compiled output several tests inspect; each is compiled only once
+PROGRAMS = {
+    "simple": "x = 42;\nprintln(x);",
+    "subroutine": "sub add(a, b) { return a + b; }\nx = add(1, 2);",
+    # One program touching every feature checked by TestEndToEnd
+    "features": """
+        x = 10;
+        y = 20;
+        z = x + y;
+        println(z);
+
+        if x > 0 {
+            println(x);
+        }
+
+        i = 0;
+        while i < 10 {
+            i = i + 1;
+        }
+        println(i);
+
+        sub double(n) {
+            return n * 2;
+        }
+
+        result = double(x);
+        println(result);
+
+        println "Hello, World!";
+
+        sub factorial(n) {
+            if n <= 1 {
+                return 1;
+            }
+            return n * factorial(n - 1);
+        }
+
+        i = 1;
+        while i <= 5 {
+            result = factorial(i);
+            print "factorial(";
+            print(i);
+            print ") = ";
+            println(result);
+            i = i + 1;
+        }
+        """,
+}
+
+
+def fail_for(path, method):
+    """Wrap a Path method so that it raises PermissionError for one exact path.
+
+    Calls on any other path go to the original method unchanged.
+    """
+
+    def wrapper(self, *args, **kwargs):
+        if self == path:
+            raise PermissionError("Permission denied")
+        return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 @pytest.fixture
@@ -15,37 +77,54 @@ def temp_dir(tmp_path):
     return tmp_path
 
 
-class TestCompileFile:
-    """Tests for the compile_file function."""
-
-    def test_compile_simple_file(self, temp_dir):
-        """Test compiling a simple toy file."""
-        # Create input file
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 42;\nprintln(x);")
+@pytest.fixture
+def arg_parser():
+    """A freshly built command-line argument parser."""
+    return build_arg_parser()
 
-        output_file = temp_dir / "test.asm"
 
-        # Compile
-        compile_file(str(input_file), str(output_file))
+@pytest.fixture(scope="session")
+def tiny_src(tmp_path_factory):
+    """A small valid source file ("x = 1;"), written once and shared by tests.
 
-        # Check output exists and has content
-        assert output_file.exists()
-        asm_content = output_file.read_text()
-        assert "section .text" in asm_content
-        assert "push qword 42" in asm_content
+    Tests must not modify it; outputs go to their own temp_dir.
+    """
+    input_file = tmp_path_factory.mktemp("tiny") / "test.toy"
+    input_file.write_bytes(b"x = 1;")
+    return input_file
 
-    def test_compile_with_subroutine(self, temp_dir):
-        """Test compiling a file with a subroutine."""
-        input_file = temp_dir / "sub.toy"
-        input_file.write_text("sub add(a, b) { return a + b; }\nx = add(1, 2);")
 
-        output_file = temp_dir / "sub.asm"
+@pytest.fixture(scope="session")
+def compiled_programs(tmp_path_factory):
+    """Compile each program in PROGRAMS once per session with compile_file.
 
+    Returns:
+        A mapping from program name to its (source path, generated assembly) pair.
+    """
+    source_dir = tmp_path_factory.mktemp("toy_sources")
+    compiled = {}
+    for name, source in PROGRAMS.items():
+        input_file = source_dir / f"{name}.toy"
+        input_file.write_text(source)
+        output_file = source_dir / f"{name}.asm"
         compile_file(str(input_file), str(output_file))
+        compiled[name] = (input_file, output_file.read_text())
+    return compiled
 
-        assert output_file.exists()
-        asm_content = output_file.read_text()
+
+class TestCompileFile:
+    """Tests for the compile_file function."""
+
+    def test_compile_simple_file(self, compiled_programs):
+        """Test compiling a simple toy file."""
+        # The output was written and read back by the fixture
+        asm_content = compiled_programs["simple"][1]
+        assert "section .text" in asm_content
+        assert "mov rax, 42" in asm_content
+
+    def test_compile_with_subroutine(self, compiled_programs):
+        """Test compiling a file with a subroutine."""
+        asm_content = compiled_programs["subroutine"][1]
         assert "sub_add.start:" in asm_content
 
     def test_input_file_not_found(self, temp_dir, capsys):
@@ -65,7 +144,7 @@ class TestCompileFile:
         """Test error handling for parse errors."""
         input_file = temp_dir / "bad_syntax.toy"
         # Invalid syntax: missing semicolon
-        input_file.write_text("x = 42")
+        input_file.write_bytes(b"x = 42")
 
         output_file = temp_dir / "output.asm"
 
@@ -77,10 +156,9 @@ class TestCompileFile:
         captured = capsys.readouterr()
         assert "Parse error" in captured.err or "error" in captured.err.lower()
 
-    def test_output_directory_created(self, temp_dir):
+    def test_output_directory_created(self, tiny_src, temp_dir):
         """Test that output directory is created if it doesn't exist."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
+        input_file = tiny_src
 
         # Output in nested directory that doesn't exist
         output_file = temp_dir / "build" / "output" / "test.asm"
@@ -90,22 +168,13 @@ class TestCompileFile:
         assert output_file.exists()
         assert output_file.parent.exists()
 
-    def test_read_error(self, temp_dir, capsys, monkeypatch):
+    def test_read_error(self, tiny_src, temp_dir, capsys, monkeypatch):
         """Test error handling when file read fails."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
+        input_file = tiny_src
 
         output_file = temp_dir / "output.asm"
 
-        # Mock Path.read_text to raise an exception
-        original_read_text = Path.read_text
-
-        def mock_read_text(self, *args, **kwargs):
-            if self.name == "test.toy":
-                raise PermissionError("Permission denied")
-            return original_read_text(self, *args, **kwargs)
-
-        monkeypatch.setattr(Path, "read_text", mock_read_text)
+        monkeypatch.setattr(Path, "read_text", fail_for(input_file, Path.read_text))
 
         with pytest.raises(SystemExit) as exc_info:
             compile_file(str(input_file), str(output_file))
@@ -115,22 +184,13 @@ class TestCompileFile:
         captured = capsys.readouterr()
         assert "Error reading" in captured.err
 
-    def test_write_error(self, temp_dir, capsys, monkeypatch):
+    def test_write_error(self, tiny_src, temp_dir, capsys, monkeypatch):
         """Test error handling when file write fails."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
+        input_file = tiny_src
 
         output_file = temp_dir / "output.asm"
 
-        # Mock Path.write_text to raise an exception
-        original_write_text = Path.write_text
-
-        def mock_write_text(self, *args, **kwargs):
-            if self.name == "output.asm":
-                raise PermissionError("Permission denied")
-            return original_write_text(self, *args, **kwargs)
-
-        monkeypatch.setattr(Path, "write_text", mock_write_text)
+        monkeypatch.setattr(Path, "open", fail_for(output_file, Path.open))
 
         with pytest.raises(SystemExit) as exc_info:
             compile_file(str(input_file), str(output_file))
@@ -140,10 +200,25 @@ class TestCompileFile:
         captured = capsys.readouterr()
         assert "Error writing" in captured.err
 
-    def test_success_message(self, temp_dir, capsys):
+    def test_optimizer_error_leaves_no_output(self, tiny_src, temp_dir, capsys, monkeypatch):
+        """Test that a failure while rendering the assembly does not touch the output file."""
+        output_file = temp_dir / "output.asm"
+
+        def fail_optimize(code):
+            raise RuntimeError("optimizer failed")
+
+        monkeypatch.setattr("src.compiler.peephole.optimize", fail_optimize)
+
+        with pytest.raises(SystemExit) as exc_info:
+            compile_file(str(tiny_src), str(output_file))
+
+        assert exc_info.value.code == 1
+        assert not output_file.exists()
+        assert "Compilation error" in capsys.readouterr().err
+
+    def test_success_message(self, tiny_src, temp_dir, capsys):
         """Test that success message is printed."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
+        input_file = tiny_src
 
         output_file = temp_dir / "test.asm"
 
@@ -154,14 +229,45 @@ class TestCompileFile:
         assert "test.asm" in captured.out
 
 
+class TestCompileBatch:
+    """Tests for batch compilation."""
+
+    def test_compile_batch(self, temp_dir):
+        """Test that a batch compiles each file independently."""
+        inputs = []
+        for name, source in (("a", b"x = 1;\nprintln x;"), ("b", b'println "hi";')):
+            input_file = temp_dir / f"{name}.toy"
+            input_file.write_bytes(source)
+            inputs.append((str(input_file), str(temp_dir / f"{name}.asm")))
+
+        assert compile_batch(inputs) == []
+
+        for input_file, output_file in inputs:
+            separate = temp_dir / "separate.asm"
+            compile_file(input_file, str(separate))
+            assert Path(output_file).read_text() == separate.read_text()
+
+    def test_compile_batch_continues_after_error(self, tiny_src, temp_dir, capsys):
+        """Test that a failing file is reported and the rest of the batch still compiles."""
+        bad = temp_dir / "bad.toy"
+        bad.write_bytes(b"x = 42")
+        output_file = temp_dir / "good.asm"
+
+        failed = compile_batch(
+            [(str(bad), str(temp_dir / "bad.asm")), (str(tiny_src), str(output_file))]
+        )
+
+        assert failed == [str(bad)]
+        assert output_file.exists()
+        assert "Parse error" in capsys.readouterr().err
+
+
 class TestMain:
     """Tests for the main CLI function."""
 
-    def test_main_with_valid_args(self, temp_dir, monkeypatch):
-        """Test main function with valid arguments."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
-
+    def test_main_with_valid_args(self, compiled_programs, temp_dir, monkeypatch):
+        """Test main function with valid arguments (both positionals given)."""
+        input_file = compiled_programs["simple"][0]
         output_file = temp_dir / "test.asm"
 
         # Mock sys.argv
@@ -171,7 +277,29 @@ class TestMain:
         main()
 
         # Check output was created
-        assert output_file.exists()
+        assert output_file.read_text() == compiled_programs["simple"][1]
+
+    def test_main_also_compiles_more_files(self, compiled_programs, temp_dir, monkeypatch):
+        """Test that --also adds further input/output pairs to the same run."""
+        simple, subroutine = compiled_programs["simple"], compiled_programs["subroutine"]
+        argv = ["toy-compiler", str(simple[0]), str(temp_dir / "a.asm")]
+        argv += ["--also", str(subroutine[0]), str(temp_dir / "b.asm")]
+        monkeypatch.setattr(sys, "argv", argv)
+
+        main()
+
+        assert (temp_dir / "a.asm").read_text() == simple[1]
+        assert (temp_dir / "b.asm").read_text() == subroutine[1]
+
+    def test_main_exits_nonzero_on_failure(self, temp_dir, monkeypatch):
+        """Test that main exits with status 1 when a file fails to compile."""
+        missing = temp_dir / "missing.toy"
+        monkeypatch.setattr(sys, "argv", ["toy-compiler", str(missing), str(temp_dir / "x.asm")])
+
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+
+        assert exc_info.value.code == 1
 
     def test_main_missing_arguments(self, monkeypatch, capsys):
         """Test main function with missing arguments."""
@@ -184,12 +312,10 @@ class TestMain:
         # argparse exits with code 2 for usage errors
         assert exc_info.value.code == 2
 
-    def test_main_help(self, monkeypatch, capsys):
-        """Test main function with help flag."""
-        monkeypatch.setattr(sys, "argv", ["toy-compiler", "--help"])
-
+    def test_main_help(self, arg_parser, capsys):
+        """Test the help flag."""
         with pytest.raises(SystemExit) as exc_info:
-            main()
+            arg_parser.parse_args(["--help"])
 
         # Help exits with code 0
         assert exc_info.value.code == 0
@@ -199,12 +325,10 @@ class TestMain:
         assert "input" in captured.out.lower()
         assert "output" in captured.out.lower()
 
-    def test_main_examples_in_help(self, monkeypatch, capsys):
+    def test_main_examples_in_help(self, arg_parser, capsys):
         """Test that help includes examples."""
-        monkeypatch.setattr(sys, "argv", ["toy-compiler", "--help"])
-
         with pytest.raises(SystemExit):
-            main()
+            arg_parser.parse_args(["--help"])
 
         captured = capsys.readouterr()
         assert "Examples:" in captured.out or "examples" in captured.out.lower()
@@ -213,183 +337,43 @@ class TestMain:
 class TestEndToEnd:
     """End-to-end tests for the CLI."""
 
-    def test_compile_arithmetic(self, temp_dir):
-        """Test compiling a program with arithmetic."""
-        source = """
-        x = 10;
-        y = 20;
-        z = x + y;
-        println(z);
-        """
-
-        input_file = temp_dir / "arithmetic.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "arithmetic.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-        assert "push qword 10" in asm
-        assert "push qword 20" in asm
-        assert "add rax, rbx" in asm
-        assert "call print_int" in asm
-
-    def test_compile_control_flow(self, temp_dir):
-        """Test compiling a program with control flow."""
-        source = """
-        x = 5;
-        if x > 0 {
-            println(x);
-        }
-        """
-
-        input_file = temp_dir / "control.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "control.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-        assert "cmp rax, rbx" in asm
-        assert "je fi." in asm
-        assert "call print_int" in asm
-
-    def test_compile_loop(self, temp_dir):
-        """Test compiling a program with a loop."""
-        source = """
-        i = 0;
-        while i < 10 {
-            i = i + 1;
-        }
-        println(i);
-        """
-
-        input_file = temp_dir / "loop.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "loop.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-        assert "while." in asm
-        assert "done." in asm
-        assert "jmp while." in asm
-
-    def test_compile_function(self, temp_dir):
-        """Test compiling a program with a function."""
-        source = """
-        sub double(n) {
-            return n * 2;
-        }
-
-        x = 21;
-        result = double(x);
-        println(result);
-        """
-
-        input_file = temp_dir / "function.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "function.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-        assert "sub_double.start:" in asm
-        assert "call sub_double.start" in asm
-        assert "imul rax, rbx" in asm
-
-    def test_compile_string_output(self, temp_dir):
-        """Test compiling a program with string output."""
-        source = """
-        println "Hello, World!";
-        """
-
-        input_file = temp_dir / "hello.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "hello.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-        assert "section .data" in asm
-        assert 'db "Hello, World!"' in asm
-        assert "call print_newline" in asm
-
-    def test_compile_complex_program(self, temp_dir):
-        """Test compiling a complex program with multiple features."""
-        source = """
-        sub factorial(n) {
-            if n <= 1 {
-                return 1;
-            }
-            return n * factorial(n - 1);
-        }
-
-        i = 1;
-        while i <= 5 {
-            result = factorial(i);
-            print "factorial(";
-            print(i);
-            print ") = ";
-            println(result);
-            i = i + 1;
-        }
-        """
-
-        input_file = temp_dir / "factorial.toy"
-        input_file.write_text(source)
-
-        output_file = temp_dir / "factorial.asm"
-
-        compile_file(str(input_file), str(output_file))
-
-        asm = output_file.read_text()
-
-        # Check for subroutine
-        assert "sub_factorial.start:" in asm
-
-        # Check for loop
-        assert "while." in asm
-        assert "done." in asm
-
-        # Check for if statement
-        assert "if." in asm
-        assert "fi." in asm
-
-        # Check for string data
-        assert "section .data" in asm
-        assert 'db "factorial("' in asm
-        assert 'db ") = "' in asm
-
-        # Check for recursive call
-        assert "call sub_factorial.start" in asm
+    @pytest.mark.parametrize(
+        "needles",
+        [
+            # Arithmetic
+            ["mov rax, 10", "mov rax, 20", "add rax, qword [rbp-16]", "call print_int"],
+            # Control flow
+            ["cmp rax, 0", "je fi.", "call print_int"],
+            # Loops
+            ["while.", "done.", "jmp while."],
+            # Subroutines
+            ["sub_double.start:", "call sub_double.start", "imul rax, 2"],
+            # String output
+            ["section .data", 'db "Hello, World!"', "call print_newline"],
+            # Recursion, nested control flow and strings combined
+            [
+                "sub_factorial.start:",
+                "if.",
+                "fi.",
+                'db "factorial("',
+                'db ") = "',
+                "call sub_factorial.start",
+            ],
+        ],
+        ids=["arithmetic", "control_flow", "loop", "function", "string_output", "complex"],
+    )
+    def test_compile_features(self, compiled_programs, needles):
+        """Test that compiling each language feature produces the expected assembly."""
+        asm = compiled_programs["features"][1]
+        missing = [needle for needle in needles if needle not in asm]
+        assert not missing
 
 
 class TestArgparse:
     """Tests for argument parsing."""
 
-    def test_parser_description(self):
+    def test_parser_description(self, arg_parser):
         """Test that parser has a proper description."""
-        parser = argparse.ArgumentParser(
-            description="Compile toy language source to x86-64 assembly"
-        )
-        assert parser.description is not None
-        assert "toy language" in parser.description.lower()
-        assert "assembly" in parser.description.lower()
-
-    def test_positional_arguments(self, temp_dir, monkeypatch):
-        """Test that positional arguments are required."""
-        input_file = temp_dir / "test.toy"
-        input_file.write_text("x = 1;")
-        output_file = temp_dir / "test.asm"
-
-        # Test with both arguments
-        monkeypatch.setattr(sys, "argv", ["toy-compiler", str(input_file), str(output_file)])
-        main()  # Should succeed
-
-        assert output_file.exists()
+        assert arg_parser.description is not None
+        assert "toy language" in arg_parser.description.lower()
+        assert "assembly" in arg_parser.description.lower()
@@ -1,10 +1,22 @@
 """Tests for the compiler module."""
 
+import io
+from collections import ChainMap
+from functools import cache
+
 import pytest
 
 from src.ast_nodes import *
-from src.compiler import Compiler, FrameMetadata
-from src.parser import Parser
+from src.compiler import (
+    ASM_ASSIGNMENT,
+    ASM_PRINT_INT,
+    ASM_VAR_ALLOC,
+    ASM_VAR_DEALLOC,
+    Compiler,
+    FrameMetadata,
+    format_template,
+)
+from src.parser import Parser, get_parser
 
 
 @pytest.fixture
@@ -13,18 +25,15 @@ def compiler():
     return Compiler()
 
 
-@pytest.fixture
-def parser():
-    """Create a parser instance for testing."""
-    return Parser()
-
-
+@cache
 def compile_code(code: str) -> str:
-    """Helper function to parse and compile code."""
-    parser = Parser()
-    compiler = Compiler()
-    ast = parser.parse(code, "test.toy")
-    return compiler.compile(ast)
+    """Helper function to parse and compile code.
+
+    Compilation is deterministic, so the assembly for each distinct snippet is
+    produced once per session and shared by every test that compiles it.
+    """
+    ast = get_parser().parse(code, "test.toy")
+    return Compiler().compile(ast)
 
 
 class TestBasicCompilation:
@@ -41,14 +50,62 @@ class TestBasicCompilation:
         assert "_start:" in asm
         assert "syscall" in asm  # Exit syscall
 
+    def test_reset_between_programs(self):
+        """Test that a reset compiler produces the same output as a fresh one."""
+        program = Parser().parse("x = 1;\nwhile x < 3 { x = x + 1; }")
+        compiler = Compiler()
+        compiler.compile(Parser().parse('println "hello";'))
+
+        compiler.reset()
+
+        assert compiler.compile(program) == Compiler().compile(program)
+
+    def test_recompile_after_appending_statement(self):
+        """Test that a program changed after compiling gets a frame for its new variables."""
+        program = Program([Assignment("a", Number(1))])
+        Compiler().compile(program)
+
+        program.top_level.append(Assignment("b", Var("a")))
+        asm = Compiler().compile(program)
+
+        assert "sub rsp, 16" in asm
+
+    def test_write_output_matches_compile(self):
+        """Test that streaming the output writes the same text compile() returns."""
+        program = Parser().parse('sub f() { return 1; }\nprintln "hi";\nx = f();')
+        expected = Compiler().compile(program)
+
+        compiler = Compiler()
+        compiler.program(program)
+        out = io.StringIO()
+        compiler.write_output(out)
+
+        assert out.getvalue() == expected
+
+    def test_write_output_of_rendered_sections(self):
+        """Test that pre-rendered sections are written as compile() would return them."""
+        program = Parser().parse('println "hi";\nx = 1;')
+        expected = Compiler().compile(program)
+
+        compiler = Compiler()
+        compiler.program(program)
+        sections = compiler.render_sections()
+        out = io.StringIO()
+        compiler.write_output(out, sections)
+
+        assert [section.split("\n", 1)[0] for section in sections] == [
+            "section .data",
+            "section .text",
+        ]
+        assert out.getvalue() == expected
+
     def test_simple_assignment(self):
         """Test compiling a simple assignment."""
         code = "x = 42;"
         asm = compile_code(code)
 
-        # Should push number and pop to variable location
-        assert "push qword 42" in asm
-        assert "pop rax" in asm
+        # Should load number and store it to variable location
+        assert "mov rax, 42" in asm
         assert "mov qword [rbp" in asm
 
     def test_print_number(self):
@@ -56,8 +113,8 @@ class TestBasicCompilation:
         code = "print(42);"
         asm = compile_code(code)
 
-        assert "push qword 42" in asm
-        assert "pop rdi" in asm
+        assert "mov rax, 42" in asm
+        assert "mov rdi, rax" in asm
         assert "call print_int" in asm
 
     def test_println_number(self):
@@ -65,7 +122,8 @@ class TestBasicCompilation:
         code = "println(42);"
         asm = compile_code(code)
 
-        assert "push qword 42" in asm
+        assert "mov rax, 42" in asm
+        assert "mov rdi, rax" in asm
         assert "call print_int" in asm
         assert "call print_newline" in asm
 
@@ -109,50 +167,80 @@ class TestBasicCompilation:
 class TestArithmeticOperations:
     """Tests for arithmetic operation compilation."""
 
-    def test_addition(self):
-        """Test compiling addition."""
-        code = "x = 1 + 2;"
+    @pytest.mark.parametrize(
+        "code, instruction",
+        [
+            ("x = a + 2;", "add rax, 2"),
+            ("x = a - 3;", "sub rax, 3"),
+            ("x = a * 3;", "imul rax, 3"),
+            ("x = -a;", "neg rax"),
+        ],
+        ids=["addition", "subtraction", "multiplication", "unary_negation"],
+    )
+    def test_operator(self, code, instruction):
+        """Test compiling an operator applied to a variable."""
         asm = compile_code(code)
 
-        assert "push qword 1" in asm
-        assert "push qword 2" in asm
-        assert "add rax, rbx" in asm
+        assert "mov rax, qword [rbp-16]" in asm
+        assert instruction in asm
 
-    def test_subtraction(self):
-        """Test compiling subtraction."""
-        code = "x = 5 - 3;"
+    def test_division(self):
+        """Test compiling division."""
+        code = "x = a / 2;"
         asm = compile_code(code)
 
-        assert "push qword 5" in asm
-        assert "push qword 3" in asm
-        assert "sub rax, rbx" in asm
+        assert "mov rax, qword [rbp-16]" in asm
+        assert "mov rcx, 2" in asm  # idiv takes no immediate
+        assert "cqo" in asm  # Sign-extend
+        assert "idiv rcx" in asm
 
-    def test_multiplication(self):
-        """Test compiling multiplication."""
-        code = "x = 4 * 3;"
-        asm = compile_code(code)
+    def test_division_by_variable(self):
+        """Test that a variable divisor is used as a memory operand."""
+        asm = compile_code("y = 2;\nx = 10 / y;")
 
-        assert "push qword 4" in asm
-        assert "push qword 3" in asm
-        assert "imul rax, rbx" in asm
+        assert "idiv qword [rbp-8]" in asm
 
-    def test_division(self):
-        """Test compiling division."""
-        code = "x = 10 / 2;"
-        asm = compile_code(code)
+    def test_leaf_operands_skip_the_stack(self):
+        """Test that number and variable operands are used in place without push/pop."""
+        asm = compile_code("y = 1;\nx = y + 2;\nz = x - y;")
 
-        assert "push qword 10" in asm
-        assert "push qword 2" in asm
-        assert "cqo" in asm  # Sign-extend
-        assert "idiv rbx" in asm
+        assert "mov rax, qword [rbp-8]" in asm
+        assert "add rax, 2" in asm
+        assert "sub rax, qword [rbp-8]" in asm
+        assert "push" not in asm.split("_start:")[1].replace("push rbp", "")
 
-    def test_unary_negation(self):
-        """Test compiling unary negation."""
-        code = "x = -5;"
-        asm = compile_code(code)
+    def test_nested_left_operand_stays_in_rax(self):
+        """Test that a non-leaf left operand with a leaf right operand needs no spill."""
+        asm = compile_code("x = (a + 2) * 3;")
+
+        assert "add rax, 2" in asm
+        assert "imul rax, 3" in asm
+        assert "push rax" not in asm
+
+    def test_nested_right_operand_spills_left(self):
+        """Test that a non-leaf right operand saves the left value on the stack."""
+        asm = compile_code("x = 3 * (a + 2);")
 
-        assert "push qword 5" in asm
-        assert "neg rax" in asm
+        assert "mov rax, 3" in asm
+        assert "push rax" in asm
+        assert "mov rcx, rax" in asm
+        assert "pop rax" in asm
+        assert "imul rax, rcx" in asm
+
+    def test_wide_immediate_goes_through_rcx(self):
+        """Test that literals wider than 32 bits are not used as immediates."""
+        asm = compile_code("x = a + 4294967296;")
+
+        assert "mov rcx, 4294967296" in asm
+        assert "add rax, rcx" in asm
+
+    def test_constant_expression_is_folded(self):
+        """Test that literal-only arithmetic is computed at compile time."""
+        asm = compile_code("x = 2 * 3 + -4;")
+
+        assert "mov rax, 2" in asm
+        assert "imul" not in asm
+        assert "neg rax" not in asm
 
 
 class TestLogicalOperations:
@@ -160,21 +248,33 @@ class TestLogicalOperations:
 
     def test_logical_and(self):
         """Test compiling logical AND."""
-        code = "x = 1 && 2;"
+        code = "x = a && b;"
         asm = compile_code(code)
 
-        assert "push qword 1" in asm
-        assert "push qword 2" in asm
-        assert "and rax, rbx" in asm
+        assert "mov rax, qword [rbp-16]" in asm
+        assert "jz and_done.0" in asm
+        assert "mov rax, qword [rbp-24]" in asm
+        assert "and_done.0:" in asm
+        assert "setne al" in asm
 
     def test_logical_or(self):
         """Test compiling logical OR."""
-        code = "x = 1 || 0;"
+        code = "x = a || b;"
         asm = compile_code(code)
 
-        assert "push qword 1" in asm
-        assert "push qword 0" in asm
-        assert "or rax, rbx" in asm
+        assert "jnz or_done.0" in asm
+        assert "or_done.0:" in asm
+        assert "setne al" in asm
+
+    def test_logical_right_operand_is_skippable(self):
+        """Test that the right operand is evaluated after the short-circuit branch."""
+        code = """
+        sub f() { return 1; }
+        x = a && f();
+        """
+        asm = compile_code(code)
+
+        assert asm.index("jz and_done.") < asm.index("call sub_f.start")
 
     def test_logical_not(self):
         """Test compiling logical NOT."""
@@ -189,53 +289,24 @@ class TestLogicalOperations:
 class TestComparisonOperations:
     """Tests for comparison operation compilation."""
 
-    def test_equality(self):
-        """Test compiling equality comparison."""
-        code = "x = a == b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "sete al" in asm
-
-    def test_inequality(self):
-        """Test compiling inequality comparison."""
-        code = "x = a != b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "setne al" in asm
-
-    def test_less_than(self):
-        """Test compiling less than comparison."""
-        code = "x = a < b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "setl al" in asm
-
-    def test_less_equal(self):
-        """Test compiling less than or equal comparison."""
-        code = "x = a <= b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "setle al" in asm
-
-    def test_greater_than(self):
-        """Test compiling greater than comparison."""
-        code = "x = a > b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "setg al" in asm
-
-    def test_greater_equal(self):
-        """Test compiling greater than or equal comparison."""
-        code = "x = a >= b;"
-        asm = compile_code(code)
-
-        assert "cmp rax, rbx" in asm
-        assert "setge al" in asm
+    @pytest.mark.parametrize(
+        "operator, setcc",
+        [
+            ("==", "sete"),
+            ("!=", "setne"),
+            ("<", "setl"),
+            ("<=", "setle"),
+            (">", "setg"),
+            (">=", "setge"),
+        ],
+        ids=["equality", "inequality", "less_than", "less_equal", "greater_than", "greater_equal"],
+    )
+    def test_comparison(self, operator, setcc):
+        """Test compiling a comparison of two variables."""
+        asm = compile_code(f"x = a {operator} b;")
+
+        assert "cmp rax, qword [rbp-24]" in asm
+        assert f"{setcc} al" in asm
 
 
 class TestControlFlow:
@@ -295,7 +366,7 @@ class TestControlFlow:
         asm = compile_code(code)
 
         # Should have loop initialization
-        assert "push qword 0" in asm
+        assert "mov rax, 0" in asm
 
         # Should have loop labels
         assert "for." in asm  # Loop condition check
@@ -316,18 +387,18 @@ class TestControlFlow:
 
         # Break should jump to loop end (done label)
         assert "done." in asm
-        # Should have at least one jump to done (the break)
-        assert asm.count("jmp done.") >= 1
+        # The break's jump is folded into the if's branch: leave the loop when i == 5
+        assert "jne done." in asm
 
     def test_for_loop_with_continue(self):
         """Test compiling a for loop with continue statement."""
-        code = "for i = 0; i < 10; i = i + 1 { if i == 5 { continue; } }"
+        code = "for i = 0; i < 10; i = i + 1 { if i == 5 { continue; } println i; }"
         asm = compile_code(code)
 
         # Continue should jump to update section
         assert "update." in asm
-        # Should have at least one jump to update (the continue)
-        assert asm.count("jmp update.") >= 1
+        # The continue's jump is folded into the if's branch: skip the body when i == 5
+        assert "jne update." in asm
 
     def test_nested_for_loops(self):
         """Test compiling nested for loops."""
@@ -367,9 +438,19 @@ class TestSubroutines:
         asm = compile_code(code)
 
         assert "sub_add.start:" in asm
-        # Parameters should be accessed with positive offsets
-        assert "[rbp+16]" in asm  # First parameter
-        assert "[rbp+24]" in asm  # Second parameter
+        # Register parameters are stored into the frame's first slots
+        assert "mov qword [rbp-8], rdi" in asm  # First parameter
+        assert "mov qword [rbp-16], rsi" in asm  # Second parameter
+
+    def test_subroutine_with_stack_params(self):
+        """Test that parameters after the sixth are accessed with positive offsets."""
+        code = "sub f(a, b, c, d, e, g, h, i) { return h + i; }"
+        asm = compile_code(code)
+
+        assert "mov qword [rbp-48], r9" in asm  # Sixth parameter
+        assert "[rbp+16]" in asm  # Seventh parameter
+        assert "[rbp+24]" in asm  # Eighth parameter
+        assert "sub rsp, 48" in asm
 
     def test_subroutine_with_local_vars(self):
         """Test compiling a subroutine with local variables."""
@@ -386,8 +467,7 @@ class TestSubroutines:
         code = "sub get_five() { return 5; }"
         asm = compile_code(code)
 
-        assert "push qword 5" in asm
-        assert "pop rax" in asm  # Return value in rax
+        assert "mov rax, 5" in asm  # Return value in rax
         assert "ret" in asm
 
     def test_subroutine_call(self):
@@ -399,10 +479,10 @@ class TestSubroutines:
         asm = compile_code(code)
 
         assert "call sub_foo.start" in asm
-        # Should clean up stack after call
-        assert "add rsp," in asm
-        # Should discard return value for call statement
-        assert "pop rax" in asm
+        # No arguments are passed on the stack, so there is nothing to clean up
+        assert "add rsp," not in asm
+        # Return value of a call statement is discarded without a stack round trip
+        assert "push qword rax" not in asm
 
     def test_subroutine_call_with_args(self):
         """Test compiling a subroutine call with arguments."""
@@ -412,13 +492,38 @@ class TestSubroutines:
         """
         asm = compile_code(code)
 
-        # Arguments should be pushed in reverse order
-        assert "push qword 2" in asm
-        assert "push qword 1" in asm
+        # Arguments are passed in registers
+        assert "mov rdi, 1" in asm
+        assert "mov rsi, 2" in asm
         assert "call sub_add.start" in asm
-        # Clean up 16 bytes (2 args * 8 bytes)
+        assert "add rsp," not in asm
+
+    def test_subroutine_call_with_stack_args(self):
+        """Test that arguments after the sixth are pushed in reverse order."""
+        code = """
+        sub f(a, b, c, d, e, g, h, i) { return i; }
+        result = f(1, 2, 3, 4, 5, 6, 7, 8);
+        """
+        asm = compile_code(code)
+
+        assert asm.index("push qword 8") < asm.index("push qword 7")
+        assert "mov r9, 6" in asm
+        # Clean up 16 bytes (2 stack args * 8 bytes)
         assert "add rsp, 16" in asm
 
+    def test_computed_args_survive_later_calls(self):
+        """Test that a computed argument is saved while the next one is evaluated."""
+        code = """
+        sub f(a, b) { return a - b; }
+        result = f(f(5, 1), f(3, 2));
+        """
+        asm = compile_code(code)
+
+        # The right argument is evaluated first and kept on the stack meanwhile
+        assert "push rax" in asm
+        assert "mov rdi, rax" in asm
+        assert "pop rsi" in asm
+
 
 class TestVariableManagement:
     """Tests for variable offset calculation and management."""
@@ -470,6 +575,13 @@ class TestLabelGeneration:
         assert "fi.0" in asm
         assert "fi.1" in asm
 
+    def test_label_group_shares_counter(self, compiler):
+        """Test that a label group shares one number and reset restarts numbering."""
+        assert compiler.fresh_label_group("if", "else", "fi") == ("if.0", "else.0", "fi.0")
+        assert compiler.fresh_label_group("while", "done") == ("while.1", "done.1")
+        compiler.reset()
+        assert compiler.fresh_label_group("const") == ("const.0",)
+
     def test_nested_loops(self):
         """Test unique labels for nested loops."""
         code = """
@@ -520,6 +632,51 @@ class TestEmitMethods:
         with pytest.raises(ValueError, match="Invalid section"):
             compiler.emit("code", section="invalid")
 
+    def test_emit_template_formats_placeholders(self, compiler):
+        """Test emitting a template with placeholder values."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+
+        compiler.emit_template(ASM_ASSIGNMENT, offset=-8)
+        output = compiler.text_top.get_output()
+
+        assert output == "section .text\n\tmov qword [rbp-8], rax"
+
+    def test_emit_template_matches_emit(self, compiler):
+        """Test that emit_template produces the same text as emitting the raw template."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+        compiler.emit_template(ASM_VAR_DEALLOC)
+
+        other = Compiler()
+        other.frame_metadata_stack.append(FrameMetadata({}))
+        other.emit(ASM_VAR_DEALLOC)
+
+        assert compiler.text_top.get_output() == other.text_top.get_output()
+
+    def test_emit_lines_and_label(self, compiler):
+        """Test emitting a batch of lines and a column-0 label."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+
+        compiler.emit_label("loop")
+        compiler.emit_lines("; Body", "jmp loop", "")
+        compiler.emit_lines("msg: db 0", section="data")
+
+        assert compiler.text_top.get_output() == "section .text\nloop:\n\t; Body\n\tjmp loop\n"
+        assert compiler.data.get_output() == "section .data\n\tmsg: db 0"
+
+    def test_format_template(self):
+        """Test that format_template fills placeholders and keeps other lines intact."""
+        lines = format_template(ASM_VAR_ALLOC, byte_count=16, var_count=2)
+
+        assert lines == (
+            "; Allocate space for variables",
+            "sub rsp, 16         ; Reserve 16 bytes (2 qwords) on stack",
+        )
+
+    def test_emit_template_invalid_section(self, compiler):
+        """Test that emit_template rejects an invalid section."""
+        with pytest.raises(ValueError, match="Invalid section"):
+            compiler.emit_template(ASM_PRINT_INT, section="invalid")
+
     def test_emit_invalid_mode(self, compiler):
         """Test that invalid mode raises error."""
         Program([])
@@ -529,6 +686,53 @@ class TestEmitMethods:
             compiler.emit("code", mode="invalid")
 
 
+class TestDispatch:
+    """Tests for statement and expression dispatch."""
+
+    def test_unknown_statement(self, compiler):
+        """Test that an unsupported statement type raises an error."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+
+        with pytest.raises(ValueError, match="Unexpected statement 'Statement'"):
+            compiler.statement(Statement())
+
+    def test_unknown_expr(self, compiler):
+        """Test that an unsupported expression type raises an error."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+
+        with pytest.raises(ValueError, match="Unexpected expr 'Expr'"):
+            compiler.expr(Expr())
+
+    def test_unknown_nested_expr(self, compiler):
+        """Test that an unsupported operand type raises an error."""
+        compiler.frame_metadata_stack.append(FrameMetadata({}))
+
+        with pytest.raises(ValueError, match="Unexpected expr 'Expr'"):
+            compiler.expr(UnaryOp(op=UnaryOpType.NEGATE, operand=Expr()))
+
+    def test_deeply_nested_expr(self):
+        """Test that expression depth is not limited by Python's recursion limit."""
+        expr: Expr = Call(name="f", args=[])
+        for _ in range(5000):
+            expr = BinOp(op=BinOpType.ADD, left=expr, right=Call(name="f", args=[]))
+        program = Program([SubroutineDef(name="f", params=[], body=[]), Println(value=expr)])
+
+        asm = Compiler().compile(program)
+
+        assert asm.count("add rax, rcx") == 5000
+
+    def test_deeply_nested_statements(self):
+        """Test that statement nesting is not limited by Python's recursion limit."""
+        body: list[Statement] = [Println(value=Number(value=1))]
+        for _ in range(3000):
+            body = [IfStmt(condition=Var(name="x"), then_body=body)]
+        program = Program(top_level=list(body))
+
+        asm = Compiler().compile(program)
+
+        assert asm.count("; End if") == 3000
+
+
 class TestComplexPrograms:
     """Tests for compiling complex programs."""
 
@@ -553,7 +757,7 @@ class TestComplexPrograms:
         # Should have recursive calls
         assert "call sub_fibonacci.start" in asm
         # Should have main program code
-        assert "push qword 10" in asm
+        assert "mov rax, 10" in asm
 
     def test_factorial(self):
         """Test compiling a factorial function."""
@@ -573,7 +777,7 @@ class TestComplexPrograms:
 
         assert "sub_factorial.start:" in asm
         assert "while." in asm
-        assert "imul rax, rbx" in asm
+        assert "imul rax, qword [rbp" in asm
         assert "call sub_factorial.start" in asm
 
     def test_multiple_subroutines(self):
@@ -624,6 +828,30 @@ class TestFrameMetadata:
         assert compiler.get_var_offset("y") == -16
         assert compiler.get_var_offset("z") == -24
 
+    def test_var_operands(self):
+        """Test that each variable's memory operand is built with the frame."""
+        frame = FrameMetadata({"a": 16, "x": -8})
+
+        assert frame.var_operands == {"a": "qword [rbp+16]", "x": "qword [rbp-8]"}
+
+    def test_subroutine_frame_offsets(self, compiler):
+        """Test a frame over separate parameter and local variable offsets."""
+        frame = FrameMetadata(ChainMap({"a": -8, "b": 16}, {"t": -16}))
+        compiler.frame_metadata_stack.append(frame)
+
+        assert compiler.get_var_offset("b") == 16
+        assert compiler.get_var_offset("t") == -16
+        assert list(frame.var_operands) == ["a", "b", "t"]
+
+    def test_frames_kept_until_reset(self, compiler):
+        """Test that frames are built once per compile and dropped by reset."""
+        program = Program([Assignment("x", Number(1))])
+        frame = compiler.program_frame(program)
+        assert compiler.program_frame(program) is frame
+
+        compiler.reset()
+        assert compiler.program_frame(program) is not frame
+
     def test_loop_labels_stack(self, compiler):
         """Test loop label stack management."""
         frame = FrameMetadata({})
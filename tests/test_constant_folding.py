@@ -0,0 +1,157 @@
+"""Tests for the constant folding pass."""
+
+from src.ast_nodes import *
+from src.constant_folding import eval_binop, fold_constants, fold_program
+
+
+def binop(op: BinOpType, left: Expr, right: Expr) -> BinOp:
+    return BinOp(op=op, left=left, right=right)
+
+
+class TestEvalBinop:
+    """Tests for evaluating operators on literals."""
+
+    def test_arithmetic(self):
+        """Test the arithmetic operators."""
+        assert eval_binop(BinOpType.ADD, 2, 3) == 5
+        assert eval_binop(BinOpType.SUB, 2, 3) == -1
+        assert eval_binop(BinOpType.MUL, -2, 3) == -6
+
+    def test_division_truncates_toward_zero(self):
+        """Test that division matches idiv rather than Python's floor division."""
+        assert eval_binop(BinOpType.DIV, 7, 2) == 3
+        assert eval_binop(BinOpType.DIV, -7, 2) == -3
+        assert eval_binop(BinOpType.DIV, 7, -2) == -3
+        assert eval_binop(BinOpType.DIV, -7, -2) == 3
+
+    def test_faulting_division_is_not_folded(self):
+        """Test that divisions that fault at run time are left alone."""
+        assert eval_binop(BinOpType.DIV, 1, 0) is None
+        assert eval_binop(BinOpType.DIV, -(2**63), -1) is None
+
+    def test_wraps_to_64_bits(self):
+        """Test that overflow wraps like the machine arithmetic."""
+        assert eval_binop(BinOpType.ADD, 2**63 - 1, 1) == -(2**63)
+        assert eval_binop(BinOpType.MUL, 2**62, 4) == 0
+
+    def test_comparisons(self):
+        """Test that comparisons produce 0 or 1."""
+        assert eval_binop(BinOpType.LT, 1, 2) == 1
+        assert eval_binop(BinOpType.GE, 1, 2) == 0
+        assert eval_binop(BinOpType.EQ, 3, 3) == 1
+
+    def test_logical_operators(self):
+        """Test that logical operators produce 0 or 1."""
+        assert eval_binop(BinOpType.AND, 1, 2) == 1
+        assert eval_binop(BinOpType.AND, 3, 0) == 0
+        assert eval_binop(BinOpType.OR, 0, 0) == 0
+        assert eval_binop(BinOpType.OR, 0, -5) == 1
+
+
+class TestFoldConstants:
+    """Tests for folding expression trees."""
+
+    def test_nested_literals(self):
+        """Test that nested literal arithmetic folds to a single number."""
+        expr = binop(BinOpType.ADD, binop(BinOpType.MUL, Number(2), Number(3)), Number(4))
+        folded = fold_constants(expr)
+        assert isinstance(folded, Number)
+        assert folded.value == 10
+
+    def test_unary_operators(self):
+        """Test that negation and logical not of literals fold."""
+        neg = fold_constants(UnaryOp(op=UnaryOpType.NEGATE, operand=Number(5)))
+        not_ = fold_constants(UnaryOp(op=UnaryOpType.NOT, operand=Number(0)))
+        assert isinstance(neg, Number) and neg.value == -5
+        assert isinstance(not_, Number) and not_.value == 1
+
+    def test_identities(self):
+        """Test the additive and multiplicative identities."""
+        x = Var("x")
+        assert fold_constants(binop(BinOpType.ADD, x, Number(0))) is x
+        assert fold_constants(binop(BinOpType.ADD, Number(0), x)) is x
+        assert fold_constants(binop(BinOpType.SUB, x, Number(0))) is x
+        assert fold_constants(binop(BinOpType.MUL, Number(1), x)) is x
+        assert fold_constants(binop(BinOpType.DIV, x, Number(1))) is x
+
+    def test_multiply_by_zero(self):
+        """Test that multiplying a pure expression by zero folds to zero."""
+        folded = fold_constants(binop(BinOpType.MUL, Var("x"), Number(0)))
+        assert isinstance(folded, Number) and folded.value == 0
+
+    def test_multiply_call_by_zero_is_kept(self):
+        """Test that an operand with side effects is not dropped."""
+        expr = binop(BinOpType.MUL, Call(name="f", args=[]), Number(0))
+        assert fold_constants(expr) is expr
+
+    def test_short_circuit_left_operand(self):
+        """Test that a deciding literal left operand drops the right operand."""
+        call = Call(name="f", args=[])
+        and_ = fold_constants(binop(BinOpType.AND, Number(0), call))
+        or_ = fold_constants(binop(BinOpType.OR, Number(7), call))
+        kept = binop(BinOpType.AND, Number(1), call)
+        assert isinstance(and_, Number) and and_.value == 0
+        assert isinstance(or_, Number) and or_.value == 1
+        assert fold_constants(kept) is kept
+
+    def test_zero_minus_is_negation(self):
+        """Test that 0 - x becomes -x."""
+        folded = fold_constants(binop(BinOpType.SUB, Number(0), Var("x")))
+        assert isinstance(folded, UnaryOp)
+        assert folded.op is UnaryOpType.NEGATE
+
+    def test_unchanged_tree_is_shared(self):
+        """Test that a tree with nothing to fold is returned as-is."""
+        program = Program([Assignment(name="x", value=binop(BinOpType.ADD, Var("y"), Number(1)))])
+        assert fold_constants(program) is program
+
+    def test_statement_bodies_are_rebuilt(self):
+        """Test that folded expressions inside nested bodies are replaced."""
+        inner = Println(value=binop(BinOpType.ADD, Number(1), Number(2)))
+        loop = WhileLoop(condition=Var("x"), body=[IfStmt(condition=Var("y"), then_body=[inner])])
+        program = fold_program(Program([SubroutineDef(name="f", params=[], body=[loop])]))
+
+        sub = program.top_level[0]
+        assert isinstance(sub, SubroutineDef) and isinstance(sub.body[0], WhileLoop)
+        if_stmt = sub.body[0].body[0]
+        assert isinstance(if_stmt, IfStmt) and if_stmt.else_body is None
+        println = if_stmt.then_body[0]
+        assert isinstance(println, Println) and isinstance(println.value, Number)
+        assert println.value.value == 3
+        assert isinstance(inner.value, BinOp)  # The input tree is not modified
+
+    def test_literal_if_is_replaced_by_its_branch(self):
+        """Test that an if with a literal condition becomes the branch it always takes."""
+        then, else_, after = (Println(value=Number(n)) for n in (1, 2, 3))
+        condition = binop(BinOpType.SUB, Number(1), Number(1))
+        inner = IfStmt(condition=condition, then_body=[then], else_body=[else_])
+        program = Program([IfStmt(condition=Number(1), then_body=[inner]), after])
+
+        assert fold_program(program).top_level == [else_, after]
+
+    def test_if_without_else_is_dropped(self):
+        """Test that an if whose condition is always false and has no else disappears."""
+        program = Program([IfStmt(condition=Number(0), then_body=[Println(value=Var("x"))])])
+        assert fold_program(program).top_level == []
+
+    def test_dead_loops(self):
+        """Test that `while 0` is dropped but a for loop still runs its initialization."""
+        while_ = WhileLoop(condition=Number(0), body=[Println(value=Var("x"))])
+        for_ = ForLoop(
+            init_var="i",
+            init_value=Number(0),
+            condition=Number(0),
+            update_var="i",
+            update_value=Number(1),
+            body=[],
+        )
+        program = Program([while_, for_])
+        assert fold_program(program).top_level == [for_]
+
+    def test_deeply_nested_expression(self):
+        """Test that folding depth is not limited by Python's recursion limit."""
+        expr: Expr = Number(0)
+        for _ in range(5000):
+            expr = binop(BinOpType.ADD, expr, Number(1))
+        folded = fold_constants(expr)
+        assert isinstance(folded, Number) and folded.value == 5000
@@ -1,15 +1,17 @@
 """Tests for the parser module."""
 
+import os
+
 import pytest
 
 from src.ast_nodes import *
-from src.parser import Parser
+from src.parser import Parser, _lark_cache_file, get_parser
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def parser():
-    """Create a parser instance for testing."""
-    return Parser()
+    """The shared parser; parsing keeps no state between calls, so tests can share it."""
+    return get_parser()
 
 
 class TestBasicStatements:
@@ -27,6 +29,14 @@ class TestBasicStatements:
         assert isinstance(stmt.value, Number)
         assert stmt.value.value == 5
 
+    def test_names_are_interned(self, parser):
+        """Test that every use of an identifier shares one string object."""
+        ast = parser.parse("counter = 1; counter = counter + 1;", "test.toy")
+
+        first, second = ast.top_level
+        assert first.name is second.name
+        assert second.value.left.name is second.name
+
     def test_print_statement(self, parser):
         """Test parsing a print statement."""
         code = "print(42);"
@@ -98,7 +108,7 @@ class TestControlFlow:
         if_stmt = ast.top_level[0]
         assert isinstance(if_stmt, IfStmt)
         assert isinstance(if_stmt.condition, BinOp)
-        assert if_stmt.condition.op == BinOpType.GT
+        assert if_stmt.condition.op is BinOpType.GT
         assert len(if_stmt.then_body) == 1
         assert if_stmt.else_body is None
 
@@ -123,7 +133,7 @@ class TestControlFlow:
         while_loop = ast.top_level[0]
         assert isinstance(while_loop, WhileLoop)
         assert isinstance(while_loop.condition, BinOp)
-        assert while_loop.condition.op == BinOpType.LT
+        assert while_loop.condition.op is BinOpType.LT
         assert len(while_loop.body) == 1
 
     def test_for_loop(self, parser):
@@ -138,10 +148,10 @@ class TestControlFlow:
         assert isinstance(for_loop.init_value, Number)
         assert for_loop.init_value.value == 0
         assert isinstance(for_loop.condition, BinOp)
-        assert for_loop.condition.op == BinOpType.LT
+        assert for_loop.condition.op is BinOpType.LT
         assert for_loop.update_var == "i"
         assert isinstance(for_loop.update_value, BinOp)
-        assert for_loop.update_value.op == BinOpType.ADD
+        assert for_loop.update_value.op is BinOpType.ADD
         assert len(for_loop.body) == 1
 
     def test_nested_for_loops(self, parser):
@@ -199,66 +209,55 @@ class TestExpressions:
         assert isinstance(value, String)
         assert value.value == "hello world"
 
-    def test_arithmetic_operations(self, parser):
+    @pytest.mark.parametrize(
+        "code, op",
+        [
+            ("x = 1 + 2;", BinOpType.ADD),
+            ("x = 5 - 3;", BinOpType.SUB),
+            ("x = 4 * 3;", BinOpType.MUL),
+            ("x = 10 / 2;", BinOpType.DIV),
+        ],
+        ids=["add", "sub", "mul", "div"],
+    )
+    def test_arithmetic_operations(self, parser, code, op):
         """Test parsing arithmetic operations."""
-        # Addition
-        code = "x = 1 + 2;"
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, BinOp)
-        assert expr.op == BinOpType.ADD
+        assert expr.op is op
         assert isinstance(expr.left, Number)
         assert isinstance(expr.right, Number)
 
-        # Subtraction
-        code = "x = 5 - 3;"
-        ast = parser.parse(code, "test.toy")
-        expr = ast.top_level[0].value
-        assert expr.op == BinOpType.SUB
-
-        # Multiplication
-        code = "x = 4 * 3;"
-        ast = parser.parse(code, "test.toy")
-        expr = ast.top_level[0].value
-        assert expr.op == BinOpType.MUL
-
-        # Division
-        code = "x = 10 / 2;"
-        ast = parser.parse(code, "test.toy")
-        expr = ast.top_level[0].value
-        assert expr.op == BinOpType.DIV
-
-    def test_comparison_operations(self, parser):
-        """Test parsing comparison operations."""
-        tests = [
+    @pytest.mark.parametrize(
+        "code, op",
+        [
             ("x = a == b;", BinOpType.EQ),
             ("x = a != b;", BinOpType.NE),
             ("x = a < b;", BinOpType.LT),
             ("x = a <= b;", BinOpType.LE),
             ("x = a > b;", BinOpType.GT),
             ("x = a >= b;", BinOpType.GE),
-        ]
-
-        for code, expected_op in tests:
-            ast = parser.parse(code, "test.toy")
-            expr = ast.top_level[0].value
-            assert isinstance(expr, BinOp)
-            assert expr.op == expected_op
-
-    def test_logical_operations(self, parser):
-        """Test parsing logical operations."""
-        # AND
-        code = "x = a && b;"
+        ],
+        ids=["eq", "ne", "lt", "le", "gt", "ge"],
+    )
+    def test_comparison_operations(self, parser, code, op):
+        """Test parsing comparison operations."""
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, BinOp)
-        assert expr.op == BinOpType.AND
-
-        # OR
-        code = "x = a || b;"
+        assert expr.op is op
+
+    @pytest.mark.parametrize(
+        "code, op",
+        [("x = a && b;", BinOpType.AND), ("x = a || b;", BinOpType.OR)],
+        ids=["and", "or"],
+    )
+    def test_logical_operations(self, parser, code, op):
+        """Test parsing logical operations."""
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
-        assert expr.op == BinOpType.OR
+        assert isinstance(expr, BinOp)
+        assert expr.op is op
 
     def test_unary_operations(self, parser):
         """Test parsing unary operations."""
@@ -267,7 +266,7 @@ class TestExpressions:
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, UnaryOp)
-        assert expr.op == UnaryOpType.NEGATE
+        assert expr.op is UnaryOpType.NEGATE
         assert isinstance(expr.operand, Number)
 
         # NOT
@@ -275,7 +274,7 @@ class TestExpressions:
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, UnaryOp)
-        assert expr.op == UnaryOpType.NOT
+        assert expr.op is UnaryOpType.NOT
 
     def test_operator_precedence(self, parser):
         """Test that operator precedence is correct."""
@@ -284,19 +283,19 @@ class TestExpressions:
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, BinOp)
-        assert expr.op == BinOpType.ADD
+        assert expr.op is BinOpType.ADD
         assert isinstance(expr.left, Number)
         assert isinstance(expr.right, BinOp)
-        assert expr.right.op == BinOpType.MUL
+        assert expr.right.op is BinOpType.MUL
 
         # Parentheses override precedence
         code = "x = (1 + 2) * 3;"
         ast = parser.parse(code, "test.toy")
         expr = ast.top_level[0].value
         assert isinstance(expr, BinOp)
-        assert expr.op == BinOpType.MUL
+        assert expr.op is BinOpType.MUL
         assert isinstance(expr.left, BinOp)
-        assert expr.left.op == BinOpType.ADD
+        assert expr.left.op is BinOpType.ADD
 
 
 class TestFunctionCalls:
@@ -331,7 +330,7 @@ class TestFunctionCalls:
 
         expr = ast.top_level[0].value
         assert isinstance(expr, BinOp)
-        assert expr.op == BinOpType.ADD
+        assert expr.op is BinOpType.ADD
         assert isinstance(expr.left, Call)
         assert expr.left.name == "foo"
         assert isinstance(expr.right, Number)
@@ -491,3 +490,61 @@ while x < 10 {
 
         inner_if = outer_if.then_body[0]
         assert isinstance(inner_if, IfStmt)
+
+
+class TestParserConstruction:
+    """Tests for building parsers."""
+
+    def test_grammar_is_shared(self):
+        """Test that parsers for the same grammar share one Lark instance."""
+        assert Parser().parser is Parser().parser
+
+    def test_parsers_are_independent(self):
+        """Test that parsers sharing a grammar still track their own filename."""
+        first, second = Parser(), Parser()
+        first.parse("x = 1;", "first.toy")
+        ast = second.parse("x = 1;", "second.toy")
+
+        location = ast.top_level[0].location
+        assert location is not None
+        assert location.file == "second.toy"
+
+    def test_lark_cache_in_user_directory(self, tmp_path, monkeypatch):
+        """Test that parse tables are cached in a private per-user directory."""
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        cache_file = _lark_cache_file("start: NAME")
+
+        assert isinstance(cache_file, str)
+        cache_dir = tmp_path / "toy-compiler"
+        assert os.path.dirname(cache_file) == str(cache_dir)
+        assert cache_dir.stat().st_mode & 0o777 == 0o700
+        assert cache_file != _lark_cache_file("start: NUMBER")
+
+    def test_lark_cache_skipped_without_directory(self, tmp_path, monkeypatch):
+        """Test that caching is turned off when the cache directory can't be created."""
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        monkeypatch.setenv("XDG_CACHE_HOME", str(blocker))
+
+        assert _lark_cache_file("start: NAME") is False
+
+    def test_shared_parser(self):
+        """Test that get_parser returns one parser per grammar file."""
+        parser = get_parser()
+        assert get_parser() is parser
+        ast = parser.parse("x = 1;", "shared.toy")
+        location = ast.top_level[0].location
+        assert location is not None
+        assert location.file == "shared.toy"
+
+    def test_shared_parser_follows_grammar_edits(self, tmp_path):
+        """Test that get_parser builds a new parser once the grammar file changes."""
+        grammar = tmp_path / "grammar.lark"
+        with open("src/grammar.lark") as f:
+            grammar.write_text(f.read())
+        parser = get_parser(str(grammar))
+        assert get_parser(str(grammar)) is parser
+
+        mtime = os.path.getmtime(grammar)
+        os.utime(grammar, (mtime + 1, mtime + 1))
+        assert get_parser(str(grammar)) is not parser
@@ -0,0 +1,47 @@
+"""Tests for the peephole optimizer."""
+
+from src.peephole import optimize, optimize_lines
+
+
+class TestJumps:
+    """Tests for jump rewriting."""
+
+    def test_jump_to_next_label_removed(self):
+        """Test that a jump to the label that follows it is removed."""
+        lines = ["\tjmp update.0", "\t; End if", "fi.1:", "update.0:", "\tret"]
+        assert optimize_lines(lines) == ["\t; End if", "fi.1:", "update.0:", "\tret"]
+
+    def test_branch_over_jump_inverted(self):
+        """Test that a branch over an unconditional jump becomes one inverted branch."""
+        lines = ["\tje fi.1          ; Jump if zero", "\tjmp done.0", "fi.1:", "\tret"]
+        assert optimize_lines(lines) == ["\tjne done.0", "fi.1:", "\tret"]
+
+    def test_jump_to_jump_threaded(self):
+        """Test that a jump to a label whose first instruction is a jump is retargeted."""
+        lines = ["\tje else.1", "\tret", "else.1:", "\t; Else branch", "\tjmp while.0"]
+        assert optimize_lines(lines) == [
+            "\tje while.0",
+            "\tret",
+            "else.1:",
+            "\t; Else branch",
+            "\tjmp while.0",
+        ]
+
+    def test_jump_cycle_is_left_alone(self):
+        """Test that threading terminates on a cycle of jumps."""
+        lines = ["a:", "\tjmp b", "b:", "\tjmp a"]
+        assert optimize_lines(lines) == ["a:", "\tjmp a", "b:", "\tjmp b"]
+
+    def test_jump_to_other_label_kept(self):
+        """Test that a jump over code to a later label is kept."""
+        lines = ["\tjmp done.0", "\tret", "done.0:"]
+        assert optimize_lines(lines) == lines
+
+
+class TestOptimize:
+    """Tests for optimizing section text."""
+
+    def test_section_text(self):
+        """Test optimizing newline-separated section text."""
+        code = "section .text\n_start:\n\tjmp done.0\ndone.0:"
+        assert optimize(code) == "section .text\n_start:\ndone.0:"
@@ -1,7 +1,12 @@
 """Tests for variable utility functions."""
 
 from src.ast_nodes import *
-from src.var_utils import collect_program_variables, collect_subroutine_local_variables
+from src.var_utils import (
+    build_program_frame,
+    build_subroutine_frame,
+    collect_program_variables,
+    collect_subroutine_local_variables,
+)
 
 
 class TestCollectProgramVariables:
@@ -239,3 +244,77 @@ class TestCollectSubroutineLocalVariables:
         )
         local_vars = collect_subroutine_local_variables(sub)
         assert local_vars == {"sum"}
+
+
+class TestBuildProgramFrame:
+    """Tests for build_program_frame function."""
+
+    def test_empty_program(self):
+        """Test building a frame for an empty program."""
+        assert build_program_frame(Program(top_level=[])) == {}
+
+    def test_offsets_in_first_appearance_order(self):
+        """Test that slots are assigned in source order, once per variable."""
+        prog = Program(
+            top_level=[
+                Assignment(name="y", value=Number(value=1)),
+                Assignment(name="x", value=Var(name="y")),
+                Assignment(name="y", value=Var(name="z")),
+            ]
+        )
+        frame = build_program_frame(prog)
+        assert list(frame.items()) == [("y", -8), ("x", -16), ("z", -24)]
+
+    def test_matches_collected_variables(self):
+        """Test that the frame covers exactly the collected variables."""
+        prog = Program(
+            top_level=[
+                Assignment(name="x", value=Number(value=1)),
+                SubroutineDef(
+                    name="foo",
+                    params=["a"],
+                    body=[Assignment(name="local", value=Var(name="a"))],
+                ),
+                Println(value=Var(name="x")),
+            ]
+        )
+        assert set(build_program_frame(prog)) == collect_program_variables(prog)
+
+    def test_frame_follows_node_changes(self):
+        """Test that a frame built after changing the program sees the new variables."""
+        prog = Program(top_level=[Assignment(name="x", value=Number(value=1))])
+        assert build_program_frame(prog) == {"x": -8}
+
+        prog.top_level.append(Println(value=Var(name="y")))
+        assert build_program_frame(prog) == {"x": -8, "y": -16}
+
+
+class TestBuildSubroutineFrame:
+    """Tests for build_subroutine_frame function."""
+
+    def test_params_and_locals(self):
+        """Test register parameter slots below rbp followed by the locals."""
+        sub = SubroutineDef(
+            name="calc",
+            params=["a", "b"],
+            body=[
+                Assignment(name="t", value=Var(name="b")),
+                Assignment(name="a", value=Var(name="u")),
+                ReturnStmt(expr=Var(name="t")),
+            ],
+        )
+        param_offsets, local_offsets = build_subroutine_frame(sub)
+        assert list(param_offsets.items()) == [("a", -8), ("b", -16)]
+        assert list(local_offsets.items()) == [("t", -24), ("u", -32)]
+        assert set(local_offsets) == collect_subroutine_local_variables(sub)
+
+    def test_stack_params(self):
+        """Test that parameters after the sixth are addressed above rbp."""
+        params = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        body: list[Statement] = [Assignment(name="t", value=Number(1))]
+        sub = SubroutineDef(name="many", params=params, body=body)
+        param_offsets, local_offsets = build_subroutine_frame(sub)
+        assert param_offsets["f"] == -48
+        assert param_offsets["g"] == 16
+        assert param_offsets["h"] == 24
+        assert local_offsets == {"t": -56}